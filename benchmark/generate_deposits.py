@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from random import Random
+from typing import List
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deposit_parser import CITATIONS_FIELDS, METADATA_FIELDS, SEPARATOR
+
+
+TYPES = ["journal article", "book chapter", "book", "proceedings article", "dataset"]
+PUBLISHERS = ["Elsevier BV [crossref:78]", "Springer Science and Business Media LLC [crossref:297]", "IOP Publishing [crossref:266]", "Institute of Electrical and Electronics Engineers (IEEE) [crossref:263]"]
+WORDS = ["numerical", "simulation", "plasma", "discharge", "transport", "streamer", "citation", "metadata", "open", "scholarly", "analysis", "method", "adaptive", "mesh"]
+
+
+def random_issn(rng:Random) -> str:
+    digits = [rng.randint(0, 9) for _ in range(7)]
+    check = (11 - sum((8 - i) * digit for i, digit in enumerate(digits)) % 11) % 11
+    return "".join(map(str, digits[:4])) + "-" + "".join(map(str, digits[4:])) + ("X" if check == 10 else str(check))
+
+def random_isbn(rng:Random) -> str:
+    digits = [9, 7, 8] + [rng.randint(0, 9) for _ in range(9)]
+    check = (10 - sum(digit * (1 if i % 2 == 0 else 3) for i, digit in enumerate(digits)) % 10) % 10
+    return "".join(map(str, digits)) + str(check)
+
+def random_orcid(rng:Random) -> str:
+    digits = [rng.randint(0, 9) for _ in range(15)]
+    total = 0
+    for digit in digits:
+        total = (total + digit) * 2
+    check = (12 - total % 11) % 11
+    orcid = "".join(map(str, digits)) + ("X" if check == 10 else str(check))
+    return "-".join(orcid[i:i+4] for i in range(0, 16, 4))
+
+def random_id(rng:Random) -> str:
+    scheme = rng.choices(["doi", "doi isbn", "pmid", "isbn", ""], weights=[70, 5, 10, 5, 10])[0]
+    doi = f"doi:10.{rng.randint(1000, 9999)}/{rng.choice(['j', 's', 'tps'])}.{rng.randint(1, 10 ** 6)}"
+    if scheme == "doi":
+        return doi
+    if scheme == "doi isbn":
+        return f"{doi} isbn:{random_isbn(rng)}"
+    if scheme == "pmid":
+        return f"pmid:{rng.randint(1, 4 * 10 ** 7)}"
+    if scheme == "isbn":
+        return f"isbn:{random_isbn(rng)}"
+    return ""
+
+def random_author(rng:Random) -> str:
+    author = f"{rng.choice(['Rossi', 'Peroni', 'Massari', 'Smith', 'Kim', 'Ebert'])}, {rng.choice(['A.', 'Silvio', 'Ute', 'Jin Myung'])}"
+    if rng.random() < 0.2:
+        author += f" [orcid:{random_orcid(rng)}]"
+    return author
+
+def metadata_row(identifier:str, rng:Random) -> dict:
+    year = rng.randint(1950, 2022)
+    first_page = rng.randint(1, 3000)
+    return {
+        "id": identifier,
+        "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))).capitalize(),
+        "author": "; ".join(random_author(rng) for _ in range(rng.randint(1, 6))),
+        "pub_date": rng.choice([str(year), f"{year}-{rng.randint(1, 12)}", f"{year}-{rng.randint(1, 12)}-{rng.randint(1, 28)}"]),
+        "venue": f"Journal of {rng.choice(WORDS).capitalize()} [issn:{random_issn(rng)}]",
+        "volume": str(rng.randint(1, 120)),
+        "issue": str(rng.randint(1, 12)),
+        "page": f"{first_page}-{first_page + rng.randint(1, 40)}",
+        "type": rng.choice(TYPES),
+        "publisher": rng.choice(PUBLISHERS),
+        "editor": ""
+    }
+
+def to_csv(rows:List[dict], fields:List[str]) -> str:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fields, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
+
+def generate_issue(number:int, rows:int, rng:Random) -> dict:
+    citing_id = f"doi:10.{rng.randint(1000, 9999)}/s{rng.randint(10 ** 4, 10 ** 5)}-022-{rng.randint(10 ** 4, 10 ** 5)}-y"
+    citing_date = f"{rng.randint(2000, 2022)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    metadata = [metadata_row(citing_id, rng)] + [metadata_row(random_id(rng), rng) for _ in range(rows - 1)]
+    citations = [
+        {"citing_id": citing_id, "citing_publication_date": citing_date, "cited_id": row["id"].split(" ")[0], "cited_publication_date": row["pub_date"]}
+        for row in metadata[1:] if row["id"]]
+    return {
+        "number": number,
+        "title": f"deposit localhost:330 {citing_id}",
+        "body": to_csv(metadata, METADATA_FIELDS) + SEPARATOR + "\n" + to_csv(citations, CITATIONS_FIELDS),
+        "author": {"id": f"U_depositor{number % 5}", "login": f"depositor{number % 5}"},
+        "createdAt": f"2022-09-{number % 28 + 1:02d}T22:34:30Z",
+        "url": f"https://github.com/arcangelo7/issues/issues/{number}"
+    }
+
+def generate_issues(issues:int, rows:int, seed:int=0) -> List[dict]:
+    rng = Random(seed)
+    return [generate_issue(number, max(1, int(rng.gauss(rows, rows / 4))), rng) for number in range(1, issues + 1)]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser("generate_deposits.py", description="Generate synthetic deposit issues in the format returned by gh issue list")
+    arg_parser.add_argument("-n", "--issues", dest="issues", type=int, default=100, help="Number of issues")
+    arg_parser.add_argument("-r", "--rows", dest="rows", type=int, default=1000, help="Average number of metadata rows per issue")
+    arg_parser.add_argument("-s", "--seed", dest="seed", type=int, default=0, help="Random seed")
+    arg_parser.add_argument("-o", "--output", dest="output", default="synthetic_issues.json", help="Output JSON file")
+    args = arg_parser.parse_args()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(generate_issues(args.issues, args.rows, args.seed), f)
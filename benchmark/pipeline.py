@@ -0,0 +1,163 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from contextlib import ExitStack
+from generate_deposits import generate_issues
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import quantiles
+from threading import Thread
+from typing import Callable, List
+from unittest.mock import MagicMock, patch
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deposit_parser import parse_deposit
+import meta_runner
+import process_issues
+
+
+class ZenodoStub(BaseHTTPRequestHandler):
+    def __send_json(self, status:int, data:dict) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.__send_json(201, {"id": 1, "links": {"bucket": f"http://localhost:{self.server.server_port}/files/bucket"}})
+
+    def do_GET(self):
+        self.__send_json(200, {"contents": []})
+
+    def do_PUT(self):
+        md5 = hashlib.md5()
+        remaining = int(self.headers["Content-Length"])
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            md5.update(chunk)
+            remaining -= len(chunk)
+        self.__send_json(201, {"checksum": f"md5:{md5.hexdigest()}"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(stage:str, func:Callable, items:List, rows:int) -> dict:
+    latencies = list()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - item_start)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    percentiles = quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "stage": stage,
+        "calls": len(items),
+        "rows": rows,
+        "seconds": round(elapsed, 4),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2)
+    }
+
+def stubs(stack:ExitStack, tmp_dir:str, zenodo_port:int, id_latency:float, github_latency:float) -> None:
+    id_manager = MagicMock()
+    id_manager.is_valid.side_effect = lambda identifier: time.sleep(id_latency) or True
+    github_client = MagicMock()
+    github_client.update_issue.side_effect = lambda *args, **kwargs: time.sleep(github_latency)
+    stack.enter_context(patch.dict(os.environ, {"ZENODO": "token"}))
+    stack.enter_context(patch("process_issues.get_id_manager", return_value=id_manager))
+    stack.enter_context(patch("process_issues.__id_exists", side_effect=lambda identifier_schema, identifier: time.sleep(id_latency) or True))
+    stack.enter_context(patch("process_issues.get_github_client", return_value=github_client))
+    stack.enter_context(patch("process_issues.get_user_id", side_effect=lambda username, node_id=None: time.sleep(github_latency) or 3869247))
+    stack.enter_context(patch("process_issues.is_in_whitelist", return_value=True))
+    stack.enter_context(patch("process_issues.ZENODO_API", f"http://localhost:{zenodo_port}/api"))
+    stack.enter_context(patch("process_issues.ZENODO_STATE_PATH", os.path.join(tmp_dir, "zenodo_deposition.json")))
+
+def run_benchmark(issues:List[dict], workers:int, id_latency:float, github_latency:float) -> List[dict]:
+    rows = sum(len(deposit.metadata) + len(deposit.citations) for deposit in map(parse_deposit, (issue["body"] for issue in issues)))
+    server = ThreadingHTTPServer(("localhost", 0), ZenodoStub)
+    Thread(target=server.serve_forever, daemon=True).start()
+    report = list()
+    with tempfile.TemporaryDirectory() as tmp_dir, ExitStack() as stack:
+        stubs(stack, tmp_dir, server.server_port, id_latency, github_latency)
+        process_issues.validated_ids.clear()
+        report.append(measure("validate", lambda issue: process_issues.validate(issue["title"], issue["body"]), issues, rows))
+        report.append(measure("get_data_to_store", lambda issue: process_issues.get_data_to_store(issue["title"], issue["body"], issue["createdAt"], issue["url"], 3869247), issues, rows))
+        process_issues.validated_ids.clear()
+        report.append(measure("process_issues", lambda batch: process_issues.process_issues(batch, workers), [issues], rows))
+        deposits_path = os.path.join(tmp_dir, "data_to_store.jsonl.gz")
+        report.append(measure("store_deposits", lambda batch: process_issues.store_processed_issues(batch, workers, path=deposits_path), [issues], rows))
+        report.append(measure("deposit_on_zenodo", process_issues.deposit_on_zenodo, [deposits_path], rows))
+        report.append(measure("store_meta_input", lambda batch: meta_runner.store_meta_input(batch, os.path.join(tmp_dir, "meta_input")), [issues], rows))
+    server.shutdown()
+    return report
+
+def find_regressions(report:List[dict], baseline:List[dict], tolerance:float) -> List[str]:
+    baseline_stages = {stage["stage"]: stage for stage in baseline}
+    regressions = list()
+    for stage in report:
+        previous = baseline_stages.get(stage["stage"])
+        if previous and stage["rows_per_second"] < previous["rows_per_second"] * (1 - tolerance):
+            regressions.append(f"{stage['stage']}: {stage['rows_per_second']} rows/s, baseline {previous['rows_per_second']} rows/s")
+        if previous and stage["peak_memory_mb"] > previous["peak_memory_mb"] * (1 + tolerance):
+            regressions.append(f"{stage['stage']}: peak {stage['peak_memory_mb']} MB, baseline {previous['peak_memory_mb']} MB")
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser("pipeline.py", description="Benchmark the issue pipeline on synthetic deposits with stubbed gh, GitHub API, id managers and Zenodo")
+    arg_parser.add_argument("-n", "--issues", dest="issues", type=int, default=50, help="Number of synthetic issues")
+    arg_parser.add_argument("-r", "--rows", dest="rows", type=int, default=1000, help="Average number of metadata rows per issue")
+    arg_parser.add_argument("-s", "--seed", dest="seed", type=int, default=0, help="Random seed of the generator")
+    arg_parser.add_argument("-w", "--workers", dest="workers", type=int, default=8, help="Number of issues processed concurrently")
+    arg_parser.add_argument("--id-latency", dest="id_latency", type=float, default=0.05, help="Simulated latency of the identifier validation API, in seconds")
+    arg_parser.add_argument("--github-latency", dest="github_latency", type=float, default=0.05, help="Simulated latency of each GitHub API call, in seconds")
+    arg_parser.add_argument("-o", "--output", dest="output", help="Write the report to this JSON file")
+    arg_parser.add_argument("-b", "--baseline", dest="baseline", help="Compare the report with a previous JSON report and fail on regressions")
+    arg_parser.add_argument("-t", "--tolerance", dest="tolerance", type=float, default=0.2, help="Tolerated relative slowdown or memory growth with respect to the baseline")
+    args = arg_parser.parse_args()
+    report = run_benchmark(generate_issues(args.issues, args.rows, args.seed), args.workers, args.id_latency, args.github_latency)
+    for stage in report:
+        print(f"{stage['stage']:<18} {stage['seconds']:>9.3f} s {stage['rows_per_second']:>12.1f} rows/s  p50 {stage['p50_ms']:.1f} ms  p95 {stage['p95_ms']:.1f} ms  p99 {stage['p99_ms']:.1f} ms  peak {stage['peak_memory_mb']:.1f} MB")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression in {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from statistics import median
+from typing import List, Union
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = {
+    "interpreter": "pass",
+    "process_issues": "import process_issues",
+    "eager imports (before)": "import pandas, oc_idmanager, process_issues"
+}
+
+
+def time_import(statement:str, repeat:int) -> Union[List[float], None]:
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", statement], cwd=ROOT, capture_output=True)
+        if output.returncode != 0:
+            return None
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser("startup.py", description="Measure the startup time of process_issues.py with and without the heavy eager imports")
+    arg_parser.add_argument("-r", "--repeat", dest="repeat", type=int, default=10, help="Number of interpreter launches per scenario")
+    args = arg_parser.parse_args()
+    for scenario, statement in SCENARIOS.items():
+        timings = time_import(statement, args.repeat)
+        if timings is None:
+            print(f"{scenario}: skipped, the imports are not available")
+            continue
+        print(f"{scenario}: median {median(timings) * 1000:.1f} ms, min {min(timings) * 1000:.1f} ms")
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from hashlib import blake2b
+from itertools import product
+from metrics import metrics
+from threading import Lock
+from typing import Iterable, List, Set, Tuple
+from urllib.parse import unquote
+import os
+import sqlite3
+
+
+INDEX_PATH = os.path.join(".cache", "deposit_index.sqlite")
+CITATIONS = "citations"
+METADATA = "metadata"
+META = "meta"
+URL_PREFIXES = {
+    "https://doi.org/": "doi:",
+    "http://doi.org/": "doi:",
+    "https://dx.doi.org/": "doi:",
+    "http://dx.doi.org/": "doi:",
+    "https://orcid.org/": "orcid:",
+    "http://orcid.org/": "orcid:",
+    "https://www.wikidata.org/wiki/": "wikidata:",
+    "https://pubmed.ncbi.nlm.nih.gov/": "pmid:"
+}
+
+
+def normalise_id(identifier:str) -> str:
+    identifier = unquote(identifier.strip()).lower()
+    for url_prefix, prefix in URL_PREFIXES.items():
+        if identifier.startswith(url_prefix):
+            identifier = prefix + identifier[len(url_prefix):]
+            break
+    schema, separator, value = identifier.partition(":")
+    if not separator:
+        return identifier
+    value = "".join(value.split())
+    if schema == "doi" and "10." in value:
+        value = value[value.index("10."):]
+    elif schema in {"isbn", "issn"}:
+        value = value.replace("-", "")
+    elif schema == "pmid":
+        value = value.strip("/").lstrip("0")
+    return f"{schema}:{value.rstrip('/')}"
+
+def normalise_ids(ids:str) -> Set[str]:
+    return {normalise_id(identifier) for identifier in ids.split()}
+
+def entry_hash(entry:str) -> int:
+    return int.from_bytes(blake2b(entry.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+def metadata_hashes(metadata:Iterable[dict]) -> Set[int]:
+    return {entry_hash(identifier) for row in metadata for identifier in normalise_ids(row["id"])}
+
+
+class DepositIndex:
+    def __init__(self, path:str=INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entries (scope TEXT NOT NULL, hash INTEGER NOT NULL, PRIMARY KEY (scope, hash)) WITHOUT ROWID")
+        self.pending = set()
+
+    def __is_known(self, scope:str, hashes:Set[int], stored_only:bool=False) -> bool:
+        if not stored_only and any((scope, entry) in self.pending for entry in hashes):
+            return True
+        placeholders = ",".join("?" * len(hashes))
+        return self.connection.execute(f"SELECT 1 FROM entries WHERE scope = ? AND hash IN ({placeholders}) LIMIT 1", (scope, *hashes)).fetchone() is not None
+
+    def __filter(self, scope:str, rows:List[dict], keys, stored_only:bool=False) -> Tuple[List[dict], int]:
+        kept = list()
+        with self.lock:
+            for row in rows:
+                hashes = {entry_hash(key) for key in keys(row)}
+                if hashes and self.__is_known(scope, hashes, stored_only):
+                    continue
+                if not stored_only:
+                    self.pending.update((scope, entry) for entry in hashes)
+                kept.append(row)
+        skipped = len(rows) - len(kept)
+        metrics.increment(f"deduplicated.{scope}", skipped)
+        return kept, skipped
+
+    def filter_citations(self, citations:List[dict], scope:str=CITATIONS) -> Tuple[List[dict], int]:
+        return self.__filter(scope, citations, lambda row: {f"{citing} {cited}" for citing, cited in product(normalise_ids(row["citing_id"]), normalise_ids(row["cited_id"]))})
+
+    def filter_metadata(self, metadata:List[dict], scope:str=METADATA, stored_only:bool=False) -> Tuple[List[dict], int]:
+        return self.__filter(scope, metadata, lambda row: normalise_ids(row["id"]), stored_only)
+
+    def add(self, scope:str, hashes:Iterable[int]) -> None:
+        with self.lock:
+            self.connection.executemany("INSERT OR IGNORE INTO entries (scope, hash) VALUES (?, ?)", ((scope, entry) for entry in hashes))
+            self.connection.commit()
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.executemany("INSERT OR IGNORE INTO entries (scope, hash) VALUES (?, ?)", self.pending)
+            self.connection.commit()
+            self.pending = set()
+
+    def rollback(self) -> None:
+        with self.lock:
+            self.pending = set()
+
+    def close(self) -> None:
+        self.connection.close()
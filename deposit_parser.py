@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from metrics import metrics
+from typing import Iterator, List, NamedTuple
+import csv
+import io
+
+
+SEPARATOR = "===###===@@@==="
+METADATA_FIELDS = ["id", "title", "author", "pub_date", "venue", "volume", "issue", "page", "type", "publisher", "editor"]
+CITATIONS_FIELDS = ["citing_id", "citing_publication_date", "cited_id", "cited_publication_date"]
+
+
+class DepositError(NamedTuple):
+    line: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}"
+
+
+class Deposit(NamedTuple):
+    metadata: List[dict]
+    citations: List[dict]
+    errors: List[DepositError]
+
+
+def iter_rows(section:str, fields:List[str], first_line:int, errors:List[DepositError]) -> Iterator[dict]:
+    reader = csv.reader(io.StringIO(section), strict=True)
+    header = None
+    try:
+        for row in reader:
+            line = first_line + reader.line_num - 1
+            if not row or len(row) == 1 and not row[0].strip():
+                continue
+            if header is None:
+                header = [value.strip() for value in row]
+                missing = [field for field in fields if field not in header]
+                unknown = [field for field in header if field not in fields]
+                if missing:
+                    errors.append(DepositError(line, f"missing columns {', '.join(missing)}"))
+                if unknown:
+                    errors.append(DepositError(line, f"unknown columns {', '.join(unknown)}"))
+                if missing or unknown:
+                    return
+                continue
+            if len(row) > len(header):
+                errors.append(DepositError(line, f"expected {len(header)} fields, found {len(row)}"))
+                continue
+            yield {field: row[i] if i < len(row) else "" for i, field in enumerate(header)}
+    except csv.Error as e:
+        errors.append(DepositError(first_line + reader.line_num - 1, str(e)))
+    if header is None:
+        errors.append(DepositError(first_line, "no CSV data found"))
+
+def parse_deposit(issue_body:str) -> Deposit:
+    with metrics.timer("parse_deposit"):
+        deposit = __parse_deposit(issue_body)
+    metrics.increment("rows_parsed.metadata", len(deposit.metadata))
+    metrics.increment("rows_parsed.citations", len(deposit.citations))
+    metrics.increment("parse_errors", len(deposit.errors))
+    return deposit
+
+def __parse_deposit(issue_body:str) -> Deposit:
+    errors = list()
+    if SEPARATOR not in issue_body:
+        return Deposit(list(), list(), [DepositError(1, f'missing separator "{SEPARATOR}"')])
+    metadata_section, citations_section = issue_body.split(SEPARATOR, 1)
+    citations_first_line = metadata_section.count("\n") + 1
+    metadata = list(iter_rows(metadata_section, METADATA_FIELDS, 1, errors))
+    citations = list(iter_rows(citations_section, CITATIONS_FIELDS, citations_first_line, errors))
+    return Deposit(metadata, citations, errors)
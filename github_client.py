@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+from requests.adapters import HTTPAdapter
+from typing import Iterable, List, Union
+from urllib.parse import quote
+import os
+import requests
+import time
+
+
+DEFAULT_REPOSITORY = os.environ.get("GITHUB_REPOSITORY", "arcangelo7/issues")
+
+
+class GitHubClient:
+    def __init__(self, repository:str=DEFAULT_REPOSITORY, token:str=None, max_retries:int=5, pool_size:int=10):
+        self.repository = repository
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update({"Accept": "application/vnd.github+json"})
+        token = token or os.environ.get("GH_TOKEN")
+        if token:
+            self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+    def __wait_time(self, response:Union[requests.Response, None], attempt:int) -> Union[float, None]:
+        if response is None or response.status_code >= 500:
+            return 2 ** attempt
+        if response.status_code not in {403, 429}:
+            return None
+        if "Retry-After" in response.headers:
+            return float(response.headers["Retry-After"])
+        if response.headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in response.headers:
+            return max(float(response.headers["X-RateLimit-Reset"]) - time.time(), 0) + 1
+        if "rate limit" in response.text.lower():
+            return 60 * 2 ** attempt
+        return None
+
+    def request(self, method:str, path:str, **kwargs) -> requests.Response:
+        url = f"https://api.github.com/repos/{self.repository}{path}"
+        attempt = 0
+        while True:
+            metrics.increment("http_calls.github")
+            try:
+                with metrics.timer(f"github.{method.lower()}"):
+                    response = self.session.request(method, url, timeout=30, **kwargs)
+            except (requests.ReadTimeout, requests.ConnectionError):
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+            wait_time = self.__wait_time(response, attempt)
+            if wait_time is None or attempt >= self.max_retries:
+                response.raise_for_status()
+                return response
+            metrics.increment("retries.github")
+            time.sleep(wait_time)
+            attempt += 1
+
+    def add_labels(self, issue_number:str, labels:List[str]) -> None:
+        self.request("POST", f"/issues/{issue_number}/labels", json={"labels": labels})
+
+    def remove_label(self, issue_number:str, label:str) -> None:
+        try:
+            self.request("DELETE", f"/issues/{issue_number}/labels/{quote(label)}")
+        except requests.HTTPError as e:
+            if e.response.status_code != 404:
+                raise
+
+    def comment(self, issue_number:str, body:str) -> None:
+        self.request("POST", f"/issues/{issue_number}/comments", json={"body": body})
+
+    def close(self, issue_number:str) -> None:
+        self.request("PATCH", f"/issues/{issue_number}", json={"state": "closed"})
+
+    def update_issue(self, issue_number:str, add_labels:Iterable[str]=(), remove_labels:Iterable[str]=(), comment:str=None, close:bool=False) -> None:
+        for label in remove_labels:
+            self.remove_label(issue_number, label)
+        if add_labels:
+            self.add_labels(issue_number, list(add_labels))
+        if comment:
+            self.comment(issue_number, comment)
+        if close:
+            self.close(issue_number)
+
+    def __try_update_issue(self, update:dict) -> bool:
+        try:
+            self.update_issue(**update)
+            return True
+        except requests.RequestException as e:
+            print(f"Issue {update['issue_number']} could not be updated: {e}")
+            metrics.increment("errors.github")
+            return False
+
+    def update_issues(self, updates:List[dict], max_workers:int=4) -> List[str]:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(self.__try_update_issue, updates)
+            return [update["issue_number"] for update, is_updated in zip(updates, results) if not is_updated]
@@ -15,8 +15,15 @@
 # SOFTWARE.
 
 
+from concurrent.futures import ThreadPoolExecutor
+from deposit_index import META, DepositIndex, metadata_hashes, normalise_ids
+from deposit_parser import METADATA_FIELDS, parse_deposit
+from github_client import GitHubClient
+from metrics import metrics, profiled
+from state_store import EXPORTED, INGESTED, StateStore
 from sys import platform
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Tuple
+import argparse
 import csv
 import io
 import json
@@ -25,52 +32,169 @@ import shutil
 import subprocess
 
 
-def dump_csv(data_to_store:List[dict], output_path:str):
-    keys = data_to_store[0].keys()
-    with open(output_path, "w", newline="") as output_file:
-        dict_writer = csv.DictWriter(output_file, keys)
-        dict_writer.writeheader()
-        dict_writer.writerows(data_to_store)
+REPOSITORY = "arcangelo7/issues"
+SHARD_ROWS = 1000
+SHARD_BYTES = 0
+SHARDS_FILE = "shards.json"
+META_DIR = "oc_meta"
+META_CONFIG = "meta_config.yaml"
 
-def store_meta_input(issues:List[dict]) -> None:
-    data_to_store = list()
-    counter = 0
-    if not os.path.exists("meta_input"):
-        os.mkdir("meta_input")
+
+def __csv_line(row:dict, fields:List[str]) -> bytes:
+    line = io.StringIO()
+    csv.DictWriter(line, fields).writerow(row)
+    return line.getvalue().encode("utf-8")
+
+def write_shards(rows:Iterable[Tuple[List[int], dict]], output_dir:str, fields:List[str], max_rows:int=SHARD_ROWS, max_bytes:int=SHARD_BYTES) -> Dict[str, List[int]]:
+    os.makedirs(output_dir, exist_ok=True)
+    header = __csv_line(dict(zip(fields, fields)), fields)
+    shards = dict()
+    output_file = None
+    shard_rows = shard_bytes = 0
+    try:
+        for issue_numbers, row in rows:
+            line = __csv_line(row, fields)
+            is_full = (max_rows and shard_rows >= max_rows) or (max_bytes and shard_rows and shard_bytes + len(line) > max_bytes)
+            if output_file is None or is_full:
+                if output_file is not None:
+                    output_file.close()
+                shard = os.path.join(output_dir, str(len(shards)))
+                os.makedirs(shard, exist_ok=True)
+                shards[shard] = list()
+                output_file = open(os.path.join(shard, f"{len(shards) - 1}.csv"), "wb")
+                output_file.write(header)
+                shard_rows, shard_bytes = 0, len(header)
+            output_file.write(line)
+            metrics.increment("meta_rows_written")
+            shards[shard].append(issue_numbers)
+            shard_rows += 1
+            shard_bytes += len(line)
+    finally:
+        if output_file is not None:
+            output_file.close()
+    return {shard: sorted({issue_number for issue_numbers in rows_issues for issue_number in issue_numbers}) for shard, rows_issues in shards.items()}
+
+def iter_meta_rows(issues:List[dict], deduplicate:bool=True, index:DepositIndex=None) -> Iterator[Tuple[List[int], dict]]:
+    seen_ids = dict()
     for issue in issues:
-        issue_body = issue["body"]
-        split_data = issue_body.split("===###===@@@===")
-        metadata = list(csv.DictReader(io.StringIO(split_data[0].strip())))
-        if len(data_to_store) < 1000:
-            data_to_store.extend(metadata)
-        elif data_to_store:
-            dump_csv(data_to_store, f"meta_input/{str(counter)}.csv")
-            data_to_store = list()
-    if data_to_store:
-        dump_csv(data_to_store, f"meta_input/{str(counter)}.csv")
+        metadata = parse_deposit(issue["body"]).metadata
+        if index:
+            # Rows repeated within this run are left to seen_ids, which keeps track of every issue sharing them
+            metadata, _ = index.filter_metadata(metadata, META, stored_only=True)
+        for row in metadata:
+            ids = normalise_ids(row["id"])
+            if deduplicate:
+                known_ids = [identifier for identifier in ids if identifier in seen_ids]
+                if known_ids:
+                    metrics.increment("meta_rows_deduplicated")
+                    seen_ids[known_ids[0]].append(issue["number"])
+                    continue
+            issue_numbers = [issue["number"]]
+            if deduplicate:
+                seen_ids.update((identifier, issue_numbers) for identifier in ids)
+            yield issue_numbers, row
+
+def store_meta_input(issues:List[dict], output_dir:str="meta_input", max_rows:int=SHARD_ROWS, max_bytes:int=SHARD_BYTES, deduplicate:bool=True, index:DepositIndex=None) -> Dict[str, List[int]]:
+    with metrics.timer("store_meta_input"):
+        shards = write_shards(iter_meta_rows(issues, deduplicate, index), output_dir, METADATA_FIELDS, max_rows, max_bytes)
+    hashes = dict()
+    if index:
+        for shard in shards:
+            with open(os.path.join(shard, f"{os.path.basename(shard)}.csv"), "r", encoding="utf-8") as f:
+                hashes[shard] = sorted(metadata_hashes(csv.DictReader(f)))
+    with open(os.path.join(output_dir, SHARDS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"shards": shards, "hashes": hashes, "done": list()}, f)
+    return shards
+
+def create_shard_config(shard:str, config_path:str=META_CONFIG) -> str:
+    import yaml
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config["input_csv_dir"] = os.path.abspath(shard)
+    shard_config_path = os.path.abspath(f"{shard}.yaml")
+    with open(shard_config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    return shard_config_path
+
+def run_meta_on_shard(shard:str, config_path:str=META_CONFIG) -> bool:
+    call_python = "python3" if platform in {"linux", "linux2", "darwin"} else "python"
+    shard_config_path = create_shard_config(shard, config_path)
+    for module in ["oc_meta.run.prepare_multiprocess", "oc_meta.run.meta_process"]:
+        with metrics.timer(f"meta.{module.split('.')[-1]}"):
+            output = subprocess.run(["poetry", "run", call_python, "-m", module, "-c", shard_config_path], cwd=META_DIR, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"{module} failed on {shard}: {output.stderr}")
+            metrics.increment("meta_shards_failed")
+            return False
+    metrics.increment("meta_shards_succeeded")
+    return True
+
+def run_meta(shards_path:str, max_workers:int=1, config_path:str=META_CONFIG, index:DepositIndex=None) -> List[int]:
+    with open(shards_path, "r", encoding="utf-8") as f:
+        shards_info = json.load(f)
+    pending = [shard for shard in shards_info["shards"] if shard not in shards_info["done"]]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(pending, executor.map(lambda shard: run_meta_on_shard(shard, config_path), pending)))
+    for shard, is_successful in results.items():
+        if is_successful:
+            if index:
+                index.add(META, shards_info.get("hashes", dict()).get(shard, list()))
+            shards_info["done"].append(shard)
+    with open(shards_path, "w", encoding="utf-8") as f:
+        json.dump(shards_info, f)
+    return sorted({issue_number for shard, is_successful in results.items() if not is_successful for issue_number in shards_info["shards"][shard]})
 
-def update_labels(multiprocess_output:subprocess.CompletedProcess, meta_output:subprocess.CompletedProcess, issues:List[dict]) -> None:
-    if multiprocess_output.returncode == 0 and meta_output.returncode == 0:
-        for issue in issues:
-            issue_number = str(issue['number'])
-            subprocess.run(["gh", "issue", "edit", issue_number, "--remove-label", "to be processed", "--add-label", "done", "--repo", "https://github.com/arcangelo7/issues"])
+def update_labels(issues:List[dict], is_successful:bool) -> List[str]:
+    github_client = GitHubClient(REPOSITORY)
+    if is_successful:
+        updates = [{"issue_number": str(issue["number"]), "remove_labels": ["to be processed"], "add_labels": ["done"]} for issue in issues]
     else:
-        for issue in issues:
-            issue_number = str(issue['number'])
-            subprocess.run(["gh", "issue", "edit", issue_number, "--add-label", "oc meta error", "--repo", "https://github.com/arcangelo7/issues"])                    
+        updates = [{"issue_number": str(issue["number"]), "add_labels": ["oc meta error"]} for issue in issues]
+    return github_client.update_issues(updates)
 
 
 if __name__ == "__main__":
-    output = subprocess.run(
-        ["gh", "issue", "list", "--state", "closed", "--label", "to be processed", "--json", "body,number", "--repo", "https://github.com/arcangelo7/issues"], 
-        capture_output=True, text=True)
-    issues = json.loads(output.stdout)
-    is_unix = platform in {"linux", "linux2", "darwin"}
-    call_python = "python3" if is_unix else "python"
-    store_meta_input(issues)
-    os.chdir("oc_meta/")
-    multiprocess_output = subprocess.run(["poetry", "run", call_python, "-m", "oc_meta.run.prepare_multiprocess", "-c", "../meta_config.yaml"], capture_output=True, text=True)
-    meta_output = subprocess.run(["poetry", "run", call_python, "-m", "oc_meta.run.meta_process", "-c", "../meta_config.yaml"], capture_output=True, text=True)
-    update_labels(multiprocess_output, meta_output, issues)
-    shutil.rmtree("../meta_input")
-    shutil.rmtree("../meta_input_old")
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser("meta_runner.py", description="Ingest the metadata of the processed deposits into OpenCitations Meta")
+    arg_parser.add_argument("-w", "--workers", dest="workers", type=int, default=int(os.environ.get("META_WORKERS", 1)), help="Number of shards processed by Meta concurrently")
+    arg_parser.add_argument("-r", "--report", dest="report", default="meta_runner_report.json", help="Path of the JSON report with the timings and counters of the run")
+    arg_parser.add_argument("-p", "--profile", dest="profile", help="Profile the run with cProfile and dump the statistics to this path")
+    args = arg_parser.parse_args()
+    try:
+        with profiled(args.profile):
+            with metrics.timer("list_issues"):
+                output = subprocess.run(
+                    ["gh", "issue", "list", "--state", "closed", "--label", "to be processed", "--json", "title,body,number", "--repo", f"https://github.com/{REPOSITORY}"], 
+                    capture_output=True, text=True)
+            issues = json.loads(output.stdout)
+            metrics.increment("issues", len(issues))
+            state = StateStore()
+            ingested = [issue for issue in issues if state.has(issue, INGESTED)]
+            issues = [issue for issue in issues if not state.has(issue, INGESTED)]
+            shards_path = os.path.join("meta_input", SHARDS_FILE)
+            failed_issues = list()
+            index = DepositIndex()
+            if issues:
+                if not os.path.exists(shards_path) or not all(state.has(issue, EXPORTED) for issue in issues):
+                    shutil.rmtree("meta_input", ignore_errors=True)
+                    store_meta_input(issues, index=index)
+                    print(f"Skipped {metrics.report()['counters'].get('deduplicated.meta', 0)} metadata rows already ingested by Meta")
+                    for issue in issues:
+                        state.mark(issue, EXPORTED)
+                with metrics.timer("run_meta"):
+                    failed_issues = run_meta(shards_path, args.workers, index=index)
+            succeeded = [issue for issue in issues if issue["number"] not in failed_issues]
+            failed = [issue for issue in issues if issue["number"] in failed_issues]
+            for issue in succeeded:
+                state.mark(issue, INGESTED)
+            with metrics.timer("update_labels"):
+                not_relabelled = update_labels(ingested + succeeded, True)
+                update_labels(failed, False)
+            for issue in ingested + succeeded:
+                if str(issue["number"]) not in not_relabelled:
+                    state.remove(issue)
+            if not failed:
+                shutil.rmtree("meta_input", ignore_errors=True)
+            index.close()
+            state.close()
+    finally:
+        metrics.write_report(args.report)
\ No newline at end of file
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from typing import Iterator
+import json
+import os
+import time
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = Lock()
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.timers = dict()
+        self.counters = dict()
+
+    @contextmanager
+    def timer(self, stage:str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                timer = self.timers.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+                timer["calls"] += 1
+                timer["seconds"] += elapsed
+                timer["max_seconds"] = max(timer["max_seconds"], elapsed)
+
+    def increment(self, counter:str, value:int=1) -> None:
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def report(self) -> dict:
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "seconds": round(time.perf_counter() - self.start, 6),
+                "stages": {stage: {key: round(value, 6) for key, value in timer.items()} for stage, timer in sorted(self.timers.items())},
+                "counters": dict(sorted(self.counters.items()))
+            }
+
+    def write_report(self, path:str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=4)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.started_at = datetime.now().isoformat()
+            self.start = time.perf_counter()
+            self.timers = dict()
+            self.counters = dict()
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(path:str=None) -> Iterator[None]:
+    if not path:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
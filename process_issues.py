@@ -15,13 +15,21 @@
 # SOFTWARE.
 
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pandas import read_csv
-from typing import List, Tuple
-import csv
-import io
+from itertools import islice
+from deposit_index import DepositIndex
+from deposit_parser import SEPARATOR, Deposit, parse_deposit
+from github_client import GitHubClient
+from metrics import metrics, profiled
+from state_store import ANSWERED, STORED, VALIDATED, StateStore
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
+from urllib.parse import quote
+import argparse
+import gzip
+import hashlib
 import json
-import oc_idmanager
 import os
 import re
 import requests
@@ -29,69 +37,247 @@ import subprocess
 import time
 
 
-def __validate_title(title:str) -> Tuple[bool, str]:
-    match = re.search(r"deposit\s+(.+?)(?:(doi|issn|isbn|pmid|pmcid|url|wikidata|wikipedia):(.+))", title)
+CACHE_DIR = ".cache"
+USER_IDS_CACHE = os.path.join(CACHE_DIR, "user_node_ids.json")
+USER_IDS_TTL = 30 * 24 * 60 * 60
+VALIDATED_IDS_CACHE = os.path.join(CACHE_DIR, "validated_ids.json")
+VALIDATED_IDS_TTL = 7 * 24 * 60 * 60
+WHITELIST_PATH = "whitelist.txt"
+DEPOSITS_PATH = os.path.join(CACHE_DIR, "data_to_store.jsonl.gz")
+ZENODO_API = os.environ.get("ZENODO_API", "https://zenodo.org/api")
+ZENODO_STATE_PATH = os.path.join(CACHE_DIR, "zenodo_deposition.json")
+ZENODO_STATE_TTL = 24 * 60 * 60
+DEPOSITS_BATCH_SIZE = 100
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+ID_APIS = {
+    "doi": "https://doi.org/api/handles/{}",
+    "pmid": "https://pubmed.ncbi.nlm.nih.gov/{}/?format=pmid"
+}
+PMID_UID_PATTERN = re.compile(r'<meta\s+name="uid"\s+content="([^"]*)"')
+TITLE_PATTERN = re.compile(r"deposit\s+(.+?)(?:(doi|issn|isbn|pmid|pmcid|url|wikidata|wikipedia):(.+))")
+
+user_ids = dict()
+user_ids_lock = Lock()
+id_managers = dict()
+id_managers_lock = Lock()
+validated_ids = dict()
+validated_ids_lock = Lock()
+whitelist = set()
+whitelist_version = None
+whitelist_lock = Lock()
+github_client = None
+github_client_lock = Lock()
+
+
+def get_id_manager(identifier_schema:str):
+    import oc_idmanager
+    identifier_schema = identifier_schema.lower()
+    with id_managers_lock:
+        if identifier_schema not in id_managers:
+            id_manager_class = getattr(oc_idmanager, f"{identifier_schema.upper()}Manager", None)
+            if id_manager_class is None:
+                id_managers[identifier_schema] = None
+            elif identifier_schema in {"doi", "orcid"}:
+                id_managers[identifier_schema] = id_manager_class(use_api_service=True)
+            else:
+                id_managers[identifier_schema] = id_manager_class()
+        return id_managers[identifier_schema]
+
+def __id_exists(identifier_schema:str, identifier:str) -> Union[bool, None]:
+    tentative = 3
+    while tentative:
+        tentative -= 1
+        try:
+            metrics.increment(f"http_calls.{identifier_schema}")
+            r = requests.get(ID_APIS[identifier_schema].format(quote(identifier)), timeout=30)
+            if r.status_code == 404:
+                return False
+            if r.status_code == 200 and identifier_schema == "doi":
+                return r.json().get("responseCode") == 1
+            if r.status_code == 200:
+                return identifier in PMID_UID_PATTERN.findall(r.text)
+        except requests.ReadTimeout:
+            # Do nothing, just try again
+            pass
+        except requests.ConnectionError:
+            # Sleep 5 seconds, then try again
+            time.sleep(5)
+        metrics.increment(f"retries.{identifier_schema}")
+    return None
+
+def __check_id(identifier_schema:str, identifier:str) -> Union[bool, None]:
+    id_manager = get_id_manager(identifier_schema)
+    if id_manager is None:
+        return False
+    if identifier_schema.lower() not in ID_APIS:
+        return bool(id_manager.is_valid(identifier))
+    normalised_id = id_manager.normalise(identifier)
+    if normalised_id is None or not id_manager.check_digit(normalised_id):
+        return False
+    return __id_exists(identifier_schema.lower(), normalised_id)
+
+def is_valid_id(identifier_schema:str, identifier:str) -> Union[bool, None]:
+    key = f"{identifier_schema.lower()}:{identifier}"
+    with validated_ids_lock:
+        if key in validated_ids:
+            metrics.increment("cache_hits.validated_ids")
+            return validated_ids[key]["valid"]
+    metrics.increment("cache_misses.validated_ids")
+    with metrics.timer("validate_id"):
+        is_valid = __check_id(identifier_schema, identifier)
+    if is_valid is None:
+        metrics.increment("unchecked_ids")
+        return None
+    with validated_ids_lock:
+        validated_ids[key] = {"valid": is_valid, "timestamp": time.time()}
+    return is_valid
+
+def validate_title_ids(issue_titles:List[str], max_workers:int=8) -> None:
+    to_validate = set()
+    for issue_title in issue_titles:
+        match = TITLE_PATTERN.search(issue_title)
+        if match:
+            to_validate.add((match.group(2), match.group(3)))
+    to_validate = {(schema, identifier) for schema, identifier in to_validate if get_id_manager(schema) is not None}
+    if not to_validate:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda schema_and_id: is_valid_id(*schema_and_id), to_validate))
+
+def __validate_title(title:str) -> Tuple[Union[bool, None], str]:
+    match = TITLE_PATTERN.search(title)
     if not match:
         return False, 'The title of the issue was not structured correctly. Please, follow this format: deposit {domain name of journal} {doi or other supported identifier}. For example "deposit localhost:330 doi:10.1007/978-3-030-00668-6_8". The following identifiers are currently supported: doi, issn, isbn, pmid, pmcid, url, wikidata, and wikipedia'
     identifier_schema = match.group(2)
     identifier = match.group(3)
-    if identifier_schema.lower() in {"doi", "orcid"}:
-        id_manager = getattr(oc_idmanager, f"{identifier_schema.upper()}Manager")(use_api_service=True)
-    else:
-        id_manager = getattr(oc_idmanager, f"{identifier_schema.upper()}Manager")()
-    is_valid = id_manager.is_valid(identifier)
+    if get_id_manager(identifier_schema) is None:
+        return False, f"The identifier with literal value {identifier} specified in the issue title is not a valid {identifier_schema.upper()}, as {identifier_schema.upper()} identifiers are not supported yet"
+    is_valid = is_valid_id(identifier_schema, identifier)
+    if is_valid is None:
+        return None, f"The identifier with literal value {identifier} specified in the issue title could not be checked because the {identifier_schema.upper()} service did not answer"
     if not is_valid:
         return False, f"The identifier with literal value {identifier} specified in the issue title is not a valid {identifier_schema.upper()}"
     return True, ""
 
-def validate(issue_title:str, issue_body:str) -> Tuple[bool, str]:
+def validate(issue_title:str, issue_body:str, deposit:Deposit=None) -> Tuple[Union[bool, None], str]:
+    with metrics.timer("validate"):
+        return __validate(issue_title, issue_body, deposit)
+
+def __validate(issue_title:str, issue_body:str, deposit:Deposit=None) -> Tuple[Union[bool, None], str]:
     is_valid_title, title_message = __validate_title(issue_title)
+    if is_valid_title is None:
+        return None, title_message
     if not is_valid_title:
         return False, title_message
-    if "===###===@@@===" not in issue_body:
-        return False, 'Please use the separator "===###===@@@===" to divide metadata from citations, as shown in the following guide: https://github.com/arcangelo7/issues/blob/main/README.md'
-    try:
-        split_data = issue_body.split("===###===@@@===")
-        read_csv(io.StringIO(split_data[0].strip()))
-        read_csv(io.StringIO(split_data[1].strip()))
-        return True, "Thank you for your contribution! OpenCitations just processed the data you provided. The citations will soon be available on the [CROCI](https://opencitations.net/index/croci) index and metadata on OpenCitations Meta"
-    except Exception:
-        return False, "The data you provided could not be processed as a CSV. Please, check that the metadata CSV and the citation CSV are valid CSVs"
+    if SEPARATOR not in issue_body:
+        return False, f'Please use the separator "{SEPARATOR}" to divide metadata from citations, as shown in the following guide: https://github.com/arcangelo7/issues/blob/main/README.md'
+    deposit = deposit or parse_deposit(issue_body)
+    if deposit.errors:
+        return False, "The data you provided could not be processed as a CSV. Please, check that the metadata CSV and the citation CSV are valid CSVs. " + "; ".join(str(error) for error in deposit.errors)
+    return True, "Thank you for your contribution! OpenCitations just processed the data you provided. The citations will soon be available on the [CROCI](https://opencitations.net/index/croci) index and metadata on OpenCitations Meta"
+
+def get_github_client() -> GitHubClient:
+    global github_client
+    with github_client_lock:
+        if github_client is None:
+            github_client = GitHubClient()
+        return github_client
 
 def answer(is_valid:bool, message:str, issue_number:str) -> None:
     if is_valid:
         label = "to be processed"
     else:
         label = "rejected"
-    subprocess.run(["gh", "issue", "edit", issue_number, "--add-label", label])
-    subprocess.run(["gh", "issue", "close", issue_number, "--comment", message])
+    with metrics.timer("answer"):
+        get_github_client().update_issue(issue_number, add_labels=[label], comment=message, close=True)
 
-def get_user_id(username:str) -> str:
+def load_cache(path:str, ttl:int) -> dict:
+    if not os.path.exists(path):
+        return dict()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return dict()
+    now = time.time()
+    return {key: value for key, value in cache.items() if now - value["timestamp"] < ttl}
+
+def save_cache(cache:dict, path:str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(f"{path}.tmp", path)
+
+def __store_user_id(node_id:str, user_id:int) -> None:
+    with user_ids_lock:
+        user_ids[node_id] = {"id": user_id, "timestamp": time.time()}
+
+def get_user_id(username:str, node_id:str=None) -> int:
+    # Logins can be renamed and registered again, so only the node id is used as a cache key
+    if node_id:
+        with user_ids_lock:
+            if node_id in user_ids:
+                metrics.increment("cache_hits.user_ids")
+                return user_ids[node_id]["id"]
+    metrics.increment("cache_misses.user_ids")
     tentative = 3
     while tentative:
         tentative -= 1
         try:
-            r = requests.get(f"https://api.github.com/users/{username}", headers={"Accept":"application/vnd.github+json"}, timeout=30)
+            metrics.increment("http_calls.github")
+            with metrics.timer("get_user_id"):
+                r = requests.get(f"https://api.github.com/users/{username}", headers={"Accept":"application/vnd.github+json"}, timeout=30)
             if r.status_code == 200:
                 r.encoding = "utf-8"
                 json_res = json.loads(r.text)
-                return json_res.get("id")
+                if node_id and json_res.get("node_id") != node_id:
+                    # The login now belongs to another account
+                    return None
+                user_id = json_res.get("id")
+                if node_id:
+                    __store_user_id(node_id, user_id)
+                return user_id
         except requests.ReadTimeout:
             # Do nothing, just try again
-            pass
+            metrics.increment("retries.github")
         except requests.ConnectionError:
             # Sleep 5 seconds, then try again
+            metrics.increment("retries.github")
             time.sleep(5)
 
-def get_data_to_store(issue_title:str, issue_body:str, created_at:str, had_primary_source:str, user_id:int) -> dict:
-    split_data = issue_body.split("===###===@@@===")
-    metadata = list(csv.DictReader(io.StringIO(split_data[0].strip())))
-    citations = list(csv.DictReader(io.StringIO(split_data[1].strip())))
-    return {
+def get_author_id(author:dict) -> int:
+    return get_user_id(author["login"], author.get("id"))
+
+def __get_user_ids_graphql(node_ids:List[str], token:str) -> Dict[str, int]:
+    query = "query($ids: [ID!]!) { nodes(ids: $ids) { ... on User { id databaseId } } }"
+    metrics.increment("http_calls.github")
+    try:
+        with metrics.timer("get_user_ids_graphql"):
+            r = requests.post("https://api.github.com/graphql", json={"query": query, "variables": {"ids": node_ids}}, headers={"Authorization": f"bearer {token}"}, timeout=30)
+    except (requests.ReadTimeout, requests.ConnectionError):
+        return dict()
+    if r.status_code != 200:
+        return dict()
+    nodes = (r.json().get("data") or dict()).get("nodes") or list()
+    return {node["id"]: node["databaseId"] for node in nodes if node and node.get("databaseId")}
+
+def get_user_ids(authors:List[dict]) -> Dict[str, int]:
+    with user_ids_lock:
+        missing = list(dict.fromkeys(author["id"] for author in authors if author.get("id") and author["id"] not in user_ids))
+    token = os.environ.get("GH_TOKEN")
+    if token:
+        for i in range(0, len(missing), 100):
+            for node_id, user_id in __get_user_ids_graphql(missing[i:i+100], token).items():
+                __store_user_id(node_id, user_id)
+    return {author["login"]: get_author_id(author) for author in authors}
+
+def get_data_to_store(issue_title:str, issue_body:str, created_at:str, had_primary_source:str, user_id:int, deposit:Deposit=None, index:DepositIndex=None) -> dict:
+    deposit = deposit or parse_deposit(issue_body)
+    data_to_store = {
         "data": {
             "title": issue_title,
-            "metadata": metadata,
-            "citations": citations
+            "metadata": deposit.metadata,
+            "citations": deposit.citations
         },
         "provenance": {
             "generatedAtTime": created_at,
@@ -99,9 +285,18 @@ def get_data_to_store(issue_title:str, issue_body:str, created_at:str, had_prima
             "hadPrimarySource": had_primary_source
         }
     }
+    if index:
+        filter_deposited(data_to_store, index)
+    return data_to_store
+
+def filter_deposited(data_to_store:dict, index:DepositIndex) -> dict:
+    data_to_store["data"]["metadata"], _ = index.filter_metadata(data_to_store["data"]["metadata"])
+    data_to_store["data"]["citations"], _ = index.filter_citations(data_to_store["data"]["citations"])
+    return data_to_store
 
 def __create_deposition_resource(today:str) -> Tuple[str, str]:
-    r = requests.post("https://zenodo.org/api/deposit/depositions",
+    metrics.increment("http_calls.zenodo")
+    r = requests.post(f"{ZENODO_API}/deposit/depositions",
         params={"access_token": os.environ["ZENODO"]},
         json={"metadata": {
             "upload_type": "dataset",
@@ -117,55 +312,227 @@ def __create_deposition_resource(today:str) -> Tuple[str, str]:
             "version": "1.0.0"
         }},
         headers={"Content-Type": "application/json"})
+    r.raise_for_status()
     return r.json()["id"], r.json()["links"]["bucket"]
 
-def __upload_data(today:str, bucket:str) -> None:
-    with open("data_to_store.json", "rb") as fp:
-        r = requests.put(
-            "%s/%s" % (bucket, f"{today}_weekly_deposit.json"),
-            data=fp,
-            params={"access_token": os.environ["ZENODO"]}
-        )
+def store_deposits(data_to_store:Iterable[dict], path:str=DEPOSITS_PATH) -> int:
+    stored = 0
+    f = None
+    try:
+        for deposit in data_to_store:
+            if f is None:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                f = gzip.open(path, "at", encoding="utf-8")
+            f.write(json.dumps(deposit) + "\n")
+            stored += 1
+            metrics.increment("deposits_stored")
+    finally:
+        if f is not None:
+            f.close()
+    return stored
+
+def __md5(path:str) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class UploadProgress:
+    def __init__(self, f, size:int):
+        self.f = f
+        self.size = size
+        self.sent = 0
+        self.reported = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def read(self, size:int=-1) -> bytes:
+        chunk = self.f.read(size)
+        self.sent += len(chunk)
+        percentage = self.sent * 100 // self.size if self.size else 100
+        if percentage >= self.reported + 10 or (percentage == 100 and self.reported < 100):
+            self.reported = percentage
+            print(f"Uploaded {self.sent}/{self.size} bytes ({percentage}%)")
+        return chunk
+
+
+def __upload_data(path:str, today:str, bucket:str) -> None:
+    filename = f"{today}_weekly_deposit.jsonl.gz"
+    checksum = f"md5:{__md5(path)}"
+    metrics.increment("http_calls.zenodo")
+    r = requests.get(bucket, params={"access_token": os.environ["ZENODO"]}, timeout=30)
+    if r.status_code == 200 and any(content["key"] == filename and content["checksum"] == checksum for content in r.json().get("contents", [])):
+        print(f"{filename} has already been uploaded")
+        return
+    tentative = 3
+    while tentative:
+        tentative -= 1
+        metrics.increment("http_calls.zenodo")
+        try:
+            with open(path, "rb") as f:
+                r = requests.put(
+                    f"{bucket}/{filename}",
+                    data=UploadProgress(f, os.path.getsize(path)),
+                    params={"access_token": os.environ["ZENODO"]},
+                    headers={"Content-Type": "application/octet-stream"},
+                    timeout=300)
+            if r.status_code < 500:
+                break
+        except (requests.ReadTimeout, requests.ConnectionError):
+            if not tentative:
+                raise
+        if tentative:
+            metrics.increment("retries.zenodo")
+            time.sleep(5)
+    r.raise_for_status()
+    if r.json().get("checksum") != checksum:
+        raise ValueError(f"The checksum of the uploaded file {filename} does not match the local one ({checksum})")
     print(r.json())
 
-def deposit_on_zenodo(data_to_store:List[dict]) -> None:
-    with open('data_to_store.json', 'w') as outfile:
-        json.dump(data_to_store, outfile)
+def deposit_on_zenodo(path:str=DEPOSITS_PATH) -> None:
     today = datetime.now().strftime("%Y-%m-%d")
-    deposition_id, bucket = __create_deposition_resource(today)
-    __upload_data(today, bucket)
+    deposition = load_cache(ZENODO_STATE_PATH, ZENODO_STATE_TTL).get(today)
+    if deposition is None:
+        deposition_id, bucket = __create_deposition_resource(today)
+        deposition = {"id": deposition_id, "bucket": bucket, "timestamp": time.time()}
+        save_cache({today: deposition}, ZENODO_STATE_PATH)
+    with metrics.timer("zenodo_upload"):
+        __upload_data(path, today, deposition["bucket"])
+    os.remove(ZENODO_STATE_PATH)
+    os.remove(path)
     # r = requests.post('https://zenodo.org/api/deposit/depositions/%s/actions/publish' % deposition_id,
     #                     params={'access_token': os.environ["ZENODO"]} )
 
-def is_in_whitelist(username:int) -> bool:
-    with open("whitelist.txt", "r") as f:
-        whitelist = f.read().splitlines()
-        if str(username) not in whitelist:
-            return False
-    return True
+def load_whitelist(path:str=WHITELIST_PATH) -> Set[str]:
+    global whitelist, whitelist_version
+    version = (path, os.stat(path).st_mtime_ns)
+    with whitelist_lock:
+        if version != whitelist_version:
+            with open(path, "r") as f:
+                whitelist = {line.strip() for line in f if line.strip()}
+            metrics.increment("whitelist_loads")
+            whitelist_version = version
+        return whitelist
 
+def is_in_whitelist(username:int) -> bool:
+    return str(username) in load_whitelist()
 
-if __name__ == "__main__":
+def get_issue(issue_number:int) -> dict:
     output = subprocess.run(
-        ["gh", "issue", "list", "--state", "open", "--label", "deposit", 
-        "--json", "title,body,number,author,createdAt,url"], 
+        ["gh", "issue", "view", str(issue_number), "--json", "title,body,number,author,createdAt,url"],
         capture_output=True, text=True)
-    issues = json.loads(output.stdout)
-    data_to_store = list()
-    for issue in issues:
-        issue_number = str(issue["number"])
-        username = issue["author"]["login"]
-        user_id = get_user_id(username)
-        if not is_in_whitelist(user_id):
-            answer(False, "To make a deposit, please contact OpenCitations at <contact@opencitations.net> to register as a trusted user", issue_number)
-        else:
-            issue_title = issue["title"]
-            issue_body = issue["body"]
-            created_at = issue["createdAt"]
-            had_primary_source = issue["url"]
-            is_valid, message = validate(issue_title, issue_body)
-            answer(is_valid, message, issue_number)
-            if is_valid:
-                data_to_store.append(get_data_to_store(issue_title, issue_body, created_at, user_id))
-    # if data_to_store:
-        # deposit_on_zenodo(data_to_store)
\ No newline at end of file
+    return json.loads(output.stdout)
+
+def process_issue(issue:dict, state:StateStore=None) -> Union[dict, None]:
+    with metrics.timer("process_issue"):
+        try:
+            return __process_issue(issue, state)
+        except requests.RequestException as e:
+            # Leave the issue open, it will be processed again in the next run
+            print(f"Issue {issue['number']} could not be processed: {e}")
+            metrics.increment("errors.github")
+            return None
+
+def __process_issue(issue:dict, state:StateStore=None) -> Union[dict, None]:
+    issue_number = str(issue["number"])
+    record = state.get(issue) if state else None
+    status = record["status"] if record else dict()
+    user_id = get_author_id(issue["author"])
+    deposit = None
+    if VALIDATED in status:
+        is_valid, message = record["valid"], record["message"]
+    elif not is_in_whitelist(user_id):
+        is_valid, message = False, "To make a deposit, please contact OpenCitations at <contact@opencitations.net> to register as a trusted user"
+    else:
+        deposit = parse_deposit(issue["body"])
+        is_valid, message = validate(issue["title"], issue["body"], deposit)
+    if is_valid is None:
+        # Leave the issue open, it will be validated again in the next run
+        print(f"Issue {issue_number} postponed: {message}")
+        metrics.increment("issues_postponed")
+        return None
+    if state and VALIDATED not in status:
+        state.mark(issue, VALIDATED, valid=is_valid, message=message)
+    if ANSWERED not in status:
+        answer(is_valid, message, issue_number)
+        if state:
+            state.mark(issue, ANSWERED)
+    if is_valid and STORED not in status:
+        return get_data_to_store(issue["title"], issue["body"], issue["createdAt"], issue["url"], user_id, deposit)
+
+def iter_processed_issues(issues:List[dict], max_workers:int=8, state:StateStore=None, index:DepositIndex=None) -> Iterator[Tuple[dict, dict]]:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda issue: process_issue(issue, state), issues)
+        for issue, result in zip(issues, results):
+            if result is not None:
+                # Deduplicate in input order, so the first issue keeps the shared rows
+                yield issue, filter_deposited(result, index) if index else result
+
+def process_issues(issues:List[dict], max_workers:int=8, state:StateStore=None, index:DepositIndex=None) -> List[dict]:
+    output = list()
+    for issue, data_to_store in iter_processed_issues(issues, max_workers, state, index):
+        output.append(data_to_store)
+        if state:
+            state.mark(issue, STORED)
+    return output
+
+def store_processed_issues(issues:List[dict], max_workers:int=8, state:StateStore=None, index:DepositIndex=None, path:str=DEPOSITS_PATH, batch_size:int=DEPOSITS_BATCH_SIZE) -> int:
+    stored = 0
+    processed_issues = iter_processed_issues(issues, max_workers, state, index)
+    while True:
+        batch = list(islice(processed_issues, batch_size))
+        if not batch:
+            return stored
+        # Mark the issues only once their deposits are on disk
+        stored += store_deposits((data_to_store for _, data_to_store in batch), path)
+        if index:
+            index.commit()
+        if state:
+            for issue, _ in batch:
+                state.mark(issue, STORED)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser("process_issues.py", description="Validate, answer and store the open deposit issues")
+    arg_parser.add_argument("-w", "--workers", dest="workers", type=int, default=int(os.environ.get("MAX_WORKERS", 8)), help="Number of issues processed concurrently")
+    arg_parser.add_argument("-r", "--report", dest="report", default="process_issues_report.json", help="Path of the JSON report with the timings and counters of the run")
+    arg_parser.add_argument("-p", "--profile", dest="profile", help="Profile the run with cProfile and dump the statistics to this path")
+    args = arg_parser.parse_args()
+    try:
+        with profiled(args.profile):
+            with metrics.timer("list_issues"):
+                output = subprocess.run(
+                    ["gh", "issue", "list", "--state", "open", "--label", "deposit", 
+                    "--json", "title,body,number,author,createdAt,url"], 
+                    capture_output=True, text=True)
+            issues = json.loads(output.stdout)
+            state = StateStore()
+            open_issues = {issue["number"] for issue in issues}
+            issues.extend(get_issue(issue_number) for issue_number in state.pending(ANSWERED, STORED, valid=True) if issue_number not in open_issues)
+            metrics.increment("issues", len(issues))
+            user_ids.update(load_cache(USER_IDS_CACHE, USER_IDS_TTL))
+            validated_ids.update(load_cache(VALIDATED_IDS_CACHE, VALIDATED_IDS_TTL))
+            with metrics.timer("get_user_ids"):
+                get_user_ids([issue["author"] for issue in issues])
+            with metrics.timer("validate_title_ids"):
+                validate_title_ids([issue["title"] for issue in issues if not state.has(issue, VALIDATED) and is_in_whitelist(get_author_id(issue["author"]))], args.workers)
+            index = DepositIndex()
+            with metrics.timer("process_issues"):
+                store_processed_issues(issues, args.workers, state, index)
+            index.commit()
+            index.close()
+            state.close()
+            counters = metrics.report()["counters"]
+            print(f"Skipped {counters.get('deduplicated.citations', 0)} already deposited citations and {counters.get('deduplicated.metadata', 0)} already deposited metadata rows")
+            save_cache(user_ids, USER_IDS_CACHE)
+            save_cache(validated_ids, VALIDATED_IDS_CACHE)
+            if os.path.exists(DEPOSITS_PATH):
+                if os.environ.get("ZENODO"):
+                    deposit_on_zenodo()
+                else:
+                    print(f"ZENODO is not set, the deposits are kept in {DEPOSITS_PATH} until the next upload")
+    finally:
+        metrics.write_report(args.report)
\ No newline at end of file
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2022 Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED 'AS IS' AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from threading import Lock
+from typing import List, Union
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+STATE_PATH = os.path.join(".cache", "issues_state.sqlite")
+VALIDATED = "validated"
+ANSWERED = "answered"
+STORED = "stored"
+EXPORTED = "exported"
+INGESTED = "ingested"
+
+
+def content_hash(issue:dict) -> str:
+    return hashlib.sha256(f"{issue.get('title', '')}\n{issue['body']}".encode("utf-8")).hexdigest()
+
+
+class StateStore:
+    def __init__(self, path:str=STATE_PATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.lock = Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS issues (number INTEGER PRIMARY KEY, record TEXT NOT NULL)")
+        self.records = {number: json.loads(record) for number, record in self.connection.execute("SELECT number, record FROM issues")}
+
+    def get(self, issue:dict) -> Union[dict, None]:
+        with self.lock:
+            record = self.records.get(int(issue["number"]))
+            if record is None or record["hash"] != content_hash(issue):
+                return None
+            return record
+
+    def has(self, issue:dict, status:str) -> bool:
+        record = self.get(issue)
+        return record is not None and status in record["status"]
+
+    def mark(self, issue:dict, status:str, **data) -> None:
+        issue_hash = content_hash(issue)
+        issue_number = int(issue["number"])
+        with self.lock:
+            record = self.records.get(issue_number)
+            if record is None or record["hash"] != issue_hash:
+                record = {"hash": issue_hash, "status": dict()}
+                self.records[issue_number] = record
+            record["status"][status] = time.time()
+            record.update(data)
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO issues (number, record) VALUES (?, ?)", (issue_number, json.dumps(record)))
+
+    def remove(self, issue:dict) -> None:
+        issue_number = int(issue["number"])
+        with self.lock:
+            self.records.pop(issue_number, None)
+            with self.connection:
+                self.connection.execute("DELETE FROM issues WHERE number = ?", (issue_number,))
+
+    def pending(self, done:str, missing:str, **data) -> List[int]:
+        with self.lock:
+            return [
+                issue_number for issue_number, record in self.records.items()
+                if done in record["status"] and missing not in record["status"]
+                and all(record.get(key) == value for key, value in data.items())]
+
+    def close(self) -> None:
+        self.connection.close()
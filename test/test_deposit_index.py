@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from deposit_index import *
+import tempfile
+import unittest
+
+
+def citation(citing_id:str, cited_id:str) -> dict:
+    return {"citing_id": citing_id, "citing_publication_date": "", "cited_id": cited_id, "cited_publication_date": ""}
+
+
+class Test_deposit_index(unittest.TestCase):
+    def test_normalise_id(self):
+        self.assertEqual(normalise_id("https://doi.org/10.1007/S42835-022-01029-Y"), "doi:10.1007/s42835-022-01029-y")
+        self.assertEqual(normalise_id("DOI:https://dx.doi.org/10.1007/s42835-022-01029-y"), "doi:10.1007/s42835-022-01029-y")
+        self.assertEqual(normalise_id("isbn:978-3-528-08599-5"), "isbn:9783528085995")
+        self.assertEqual(normalise_id("issn:0021-9991"), "issn:00219991")
+        self.assertEqual(normalise_id("https://orcid.org/0000-0002-8420-0696"), "orcid:0000-0002-8420-0696")
+
+    def test_filter_citations(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "deposit_index.sqlite")
+            index = DepositIndex(path)
+            citations = [citation("doi:10.1/a", "doi:10.1/b"), citation("doi:10.1/a", "doi:10.1/c"), citation("DOI:10.1/A", "https://doi.org/10.1/B")]
+            kept, skipped = index.filter_citations(citations)
+            self.assertEqual((kept, skipped), (citations[:2], 1))
+            index.commit()
+            index.close()
+            index = DepositIndex(path)
+            kept, skipped = index.filter_citations([citation("doi:10.1/a", "doi:10.1/c pmid:1"), citation("doi:10.1/a", "doi:10.1/d"), citation("doi:10.1/a", "")])
+            self.assertEqual(([row["cited_id"] for row in kept], skipped), (["doi:10.1/d", ""], 1))
+            index.close()
+
+    def test_filter_metadata_scopes_and_rollback(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = DepositIndex(os.path.join(tmp_dir, "deposit_index.sqlite"))
+            metadata = [{"id": "doi:10.1/a isbn:978-3-528-08599-5"}, {"id": ""}, {"id": ""}]
+            self.assertEqual(index.filter_metadata(metadata), (metadata, 0))
+            index.commit()
+            self.assertEqual(index.filter_metadata([{"id": "isbn:9783528085995"}, {"id": ""}]), ([{"id": ""}], 1))
+            self.assertEqual(index.filter_metadata([{"id": "doi:10.1/a"}], META), ([{"id": "doi:10.1/a"}], 0))
+            index.rollback()
+            self.assertEqual(index.filter_metadata([{"id": "doi:10.1/a"}], META), ([{"id": "doi:10.1/a"}], 0))
+            index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from deposit_parser import *
+import unittest
+
+
+METADATA = '''"id","title","author","pub_date","venue","volume","issue","page","type","publisher","editor"
+"doi:10.1007/s42835-022-01029-y","Numerical Simulation of Gas Discharge","Choi, Chan Young","2022-2-28","Journal of Electrical Engineering & Technology [issn:1975-0102]","17","3","1873-1881","journal article","Springer Science and Business Media LLC [crossref:297]",""
+'''
+
+CITATIONS = '''"citing_id","citing_publication_date","cited_id","cited_publication_date"
+"doi:10.1007/s42835-022-01029-y","2022-02-28","doi:10.1007/978-3-662-07918-8_3","2004"
+
+"doi:10.1007/s42835-022-01029-y","2022-02-28","doi:10.1109/20.877674"
+'''
+
+
+class Test_deposit_parser(unittest.TestCase):
+    def test_parse_deposit(self):
+        deposit = parse_deposit(METADATA + SEPARATOR + "\n" + CITATIONS)
+        self.assertEqual(deposit.errors, [])
+        self.assertEqual(deposit.metadata[0]["id"], "doi:10.1007/s42835-022-01029-y")
+        self.assertEqual(deposit.citations, [
+            {"citing_id": "doi:10.1007/s42835-022-01029-y", "citing_publication_date": "2022-02-28", "cited_id": "doi:10.1007/978-3-662-07918-8_3", "cited_publication_date": "2004"},
+            {"citing_id": "doi:10.1007/s42835-022-01029-y", "citing_publication_date": "2022-02-28", "cited_id": "doi:10.1109/20.877674", "cited_publication_date": ""}])
+
+    def test_missing_separator(self):
+        deposit = parse_deposit(METADATA + CITATIONS)
+        self.assertEqual(deposit.errors, [DepositError(1, 'missing separator "===###===@@@==="')])
+
+    def test_wrong_header(self):
+        deposit = parse_deposit(METADATA + SEPARATOR + "\n" + CITATIONS.replace('"cited_id"', '"cited"'))
+        self.assertEqual(deposit.errors, [DepositError(4, "missing columns cited_id"), DepositError(4, "unknown columns cited")])
+        self.assertEqual(deposit.citations, [])
+
+    def test_errors_line_numbers(self):
+        deposit = parse_deposit(METADATA + SEPARATOR + "\n" + CITATIONS + '"a","b","c","d","e"\n"unterminated')
+        self.assertEqual([str(error) for error in deposit.errors], ["line 8: expected 4 fields, found 5", "line 9: unexpected end of data"])
+        self.assertEqual(len(deposit.citations), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
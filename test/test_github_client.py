@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from github_client import *
+from unittest.mock import MagicMock, call, patch
+import unittest
+
+
+def response(status_code:int, headers:dict=dict(), text:str="") -> MagicMock:
+    mock_response = MagicMock(status_code=status_code, headers=headers, text=text)
+    if status_code >= 400:
+        mock_response.raise_for_status.side_effect = requests.HTTPError(response=mock_response)
+    return mock_response
+
+
+class Test_github_client(unittest.TestCase):
+    def setUp(self):
+        self.github_client = GitHubClient("arcangelo7/issues", token="token", max_retries=2)
+        self.github_client.session = MagicMock()
+
+    @patch("github_client.time.sleep")
+    def test_secondary_rate_limit_retry(self, mock_sleep):
+        self.github_client.session.request.side_effect = [response(403, {"Retry-After": "3"}, "secondary rate limit"), response(201)]
+        self.github_client.add_labels("1", ["done"])
+        mock_sleep.assert_called_once_with(3.0)
+        self.assertEqual(self.github_client.session.request.call_count, 2)
+
+    @patch("github_client.time.sleep")
+    def test_retries_exhausted(self, mock_sleep):
+        self.github_client.session.request.return_value = response(502)
+        with self.assertRaises(requests.HTTPError):
+            self.github_client.close("1")
+        self.assertEqual(mock_sleep.call_args_list, [call(1), call(2)])
+
+    def test_update_issue(self):
+        self.github_client.session.request.side_effect = [response(404), response(200), response(201), response(200)]
+        self.github_client.update_issue("7", add_labels=["done"], remove_labels=["to be processed"], comment="Thanks", close=True)
+        base = "https://api.github.com/repos/arcangelo7/issues/issues/7"
+        self.assertEqual(self.github_client.session.request.call_args_list, [
+            call("DELETE", f"{base}/labels/to%20be%20processed", timeout=30),
+            call("POST", f"{base}/labels", timeout=30, json={"labels": ["done"]}),
+            call("POST", f"{base}/comments", timeout=30, json={"body": "Thanks"}),
+            call("PATCH", base, timeout=30, json={"state": "closed"})])
+
+    def test_update_issues(self):
+        self.github_client.session.request.return_value = response(200)
+        self.github_client.update_issues([{"issue_number": str(number), "add_labels": ["oc meta error"]} for number in range(5)])
+        self.assertEqual(self.github_client.session.request.call_count, 5)
+
+    def test_update_issues_error(self):
+        self.github_client.session.request.side_effect = lambda method, url, **kwargs: response(422 if "/issues/2/" in url else 200)
+        failed = self.github_client.update_issues([{"issue_number": str(number), "add_labels": ["oc meta error"]} for number in range(5)])
+        self.assertEqual(failed, ["2"])
+        self.assertEqual(self.github_client.session.request.call_count, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
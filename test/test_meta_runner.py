@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from meta_runner import *
+from unittest.mock import patch
+import tempfile
+import unittest
+
+
+HEADER = '"id","title","author","pub_date","venue","volume","issue","page","type","publisher","editor"'
+CITATIONS = '''===###===@@@===
+"citing_id","citing_publication_date","cited_id","cited_publication_date"
+"doi:10.1007/s42835-022-01029-y","2022-02-28","doi:10.1007/978-3-662-07918-8_3","2004"
+'''
+
+
+def issue(number:int, ids:List[str]) -> dict:
+    rows = "\n".join(f'"{identifier}","Title {identifier}","","","","","","","journal article","",""' for identifier in ids)
+    return {"number": number, "body": f"{HEADER}\n{rows}\n{CITATIONS}"}
+
+
+class Test_meta_runner(unittest.TestCase):
+    def test_store_meta_input_rows(self):
+        issues = [issue(1, [f"doi:10.1/{n}" for n in range(5)]), issue(2, [f"doi:10.1/{n}" for n in range(5, 7)])]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shards = store_meta_input(issues, tmp_dir, max_rows=3)
+            self.assertEqual(shards, {os.path.join(tmp_dir, "0"): [1], os.path.join(tmp_dir, "1"): [1, 2], os.path.join(tmp_dir, "2"): [2]})
+            with open(os.path.join(tmp_dir, "2", "2.csv"), "r", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual([row["id"] for row in rows], ["doi:10.1/6"])
+            self.assertEqual(list(rows[0].keys()), METADATA_FIELDS)
+            with open(os.path.join(tmp_dir, SHARDS_FILE), "r", encoding="utf-8") as f:
+                self.assertEqual(json.load(f), {"shards": shards, "hashes": {}, "done": []})
+
+    def test_store_meta_input_bytes(self):
+        issues = [issue(1, [f"doi:10.1/{n}" for n in range(10)])]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shards = store_meta_input(issues, tmp_dir, max_rows=0, max_bytes=200)
+            rows = 0
+            for n, shard in enumerate(shards):
+                shard_csv = os.path.join(shard, f"{n}.csv")
+                self.assertLessEqual(os.path.getsize(shard_csv), 200)
+                with open(shard_csv, "r", encoding="utf-8") as f:
+                    rows += len(list(csv.DictReader(f)))
+            self.assertGreater(len(shards), 1)
+            self.assertEqual(rows, 10)
+
+    def test_store_meta_input_deduplicate(self):
+        issues = [issue(1, ["doi:10.1/a", ""]), issue(2, ["DOI:10.1/A isbn:9783528085995", "", "doi:10.1/b"])]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shards = store_meta_input(issues, tmp_dir, max_rows=1)
+            self.assertEqual(list(shards.values()), [[1, 2], [1], [2], [2]])
+            with open(os.path.join(tmp_dir, "3", "3.csv"), "r", encoding="utf-8") as f:
+                self.assertEqual([row["id"] for row in csv.DictReader(f)], ["doi:10.1/b"])
+            shards = store_meta_input(issues, os.path.join(tmp_dir, "all"), max_rows=1, deduplicate=False)
+            self.assertEqual(len(shards), 5)
+
+    def test_run_meta(self):
+        issues = [issue(1, ["doi:10.1/a", "doi:10.1/b"]), issue(2, ["doi:10.1/c"]), issue(3, ["doi:10.1/d"])]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shards = list(store_meta_input(issues, tmp_dir, max_rows=2))
+            shards_path = os.path.join(tmp_dir, SHARDS_FILE)
+            with patch("meta_runner.run_meta_on_shard", side_effect=lambda shard, config_path: shard != shards[1]) as mock_run_meta_on_shard:
+                self.assertEqual(run_meta(shards_path, max_workers=2), [2, 3])
+                self.assertEqual(mock_run_meta_on_shard.call_count, 2)
+            with patch("meta_runner.run_meta_on_shard", return_value=True) as mock_run_meta_on_shard:
+                self.assertEqual(run_meta(shards_path), [])
+                mock_run_meta_on_shard.assert_called_once_with(shards[1], META_CONFIG)
+
+    def test_create_shard_config(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, "meta_config.yaml")
+            with open(config_path, "w", encoding="utf-8") as f:
+                f.write("input_csv_dir: meta_input\nbase_output_dir: ../meta_output\n")
+            os.makedirs(os.path.join(tmp_dir, "meta_input", "0"))
+            shard_config_path = create_shard_config(os.path.join(tmp_dir, "meta_input", "0"), config_path)
+            with open(shard_config_path, "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), f"base_output_dir: ../meta_output\ninput_csv_dir: {os.path.join(tmp_dir, 'meta_input', '0')}\n")
+
+    def test_store_meta_input_index(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = DepositIndex(os.path.join(tmp_dir, "deposit_index.sqlite"))
+            store_meta_input([issue(1, ["doi:10.1/a"])], os.path.join(tmp_dir, "first"), index=index)
+            with patch("meta_runner.run_meta_on_shard", return_value=True):
+                run_meta(os.path.join(tmp_dir, "first", SHARDS_FILE), index=index)
+            shards = store_meta_input([issue(2, ["https://doi.org/10.1/A", "doi:10.1/b"])], os.path.join(tmp_dir, "second"), index=index)
+            self.assertEqual(list(shards.values()), [[2]])
+            with open(os.path.join(tmp_dir, "second", "0", "0.csv"), "r", encoding="utf-8") as f:
+                self.assertEqual([row["id"] for row in csv.DictReader(f)], ["doi:10.1/b"])
+            index.close()
+
+    def test_run_meta_index_after_failure(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_path = os.path.join(tmp_dir, "deposit_index.sqlite")
+            index = DepositIndex(index_path)
+            shards = list(store_meta_input([issue(1, ["doi:10.1/a"]), issue(2, ["doi:10.1/b"])], os.path.join(tmp_dir, "meta_input"), max_rows=1, index=index))
+            shards_path = os.path.join(tmp_dir, "meta_input", SHARDS_FILE)
+            with patch("meta_runner.run_meta_on_shard", side_effect=lambda shard, config_path: shard != shards[1]):
+                self.assertEqual(run_meta(shards_path, index=index), [2])
+            index.close()
+            index = DepositIndex(index_path)
+            self.assertEqual(index.filter_metadata([{"id": "doi:10.1/a"}, {"id": "doi:10.1/b"}], META)[1], 1)
+            with patch("meta_runner.run_meta_on_shard", return_value=True):
+                self.assertEqual(run_meta(shards_path, index=index), [])
+            index.close()
+            index = DepositIndex(index_path)
+            self.assertEqual(index.filter_metadata([{"id": "doi:10.1/a"}, {"id": "doi:10.1/b"}], META)[1], 2)
+            index.close()
+
+    def test_run_meta_index_duplicate_failed_shard(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = DepositIndex(os.path.join(tmp_dir, "deposit_index.sqlite"))
+            issues = [issue(1, ["doi:10.1/a"]), issue(2, ["https://doi.org/10.1/A"]), issue(3, ["doi:10.1/b"])]
+            shards = store_meta_input(issues, os.path.join(tmp_dir, "meta_input"), max_rows=1, index=index)
+            self.assertEqual(list(shards.values()), [[1, 2], [3]])
+            failed_shard = list(shards)[0]
+            with patch("meta_runner.run_meta_on_shard", side_effect=lambda shard, config_path: shard != failed_shard):
+                self.assertEqual(run_meta(os.path.join(tmp_dir, "meta_input", SHARDS_FILE), index=index), [1, 2])
+            self.assertEqual(index.filter_metadata([{"id": "doi:10.1/a"}, {"id": "doi:10.1/b"}], META, stored_only=True)[1], 1)
+            index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
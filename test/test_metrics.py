@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from metrics import *
+from threading import Thread
+import tempfile
+import unittest
+
+
+class Test_metrics(unittest.TestCase):
+    def test_timer_and_counters(self):
+        run_metrics = Metrics()
+        def work():
+            with run_metrics.timer("stage"):
+                run_metrics.increment("rows", 10)
+        threads = [Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report = run_metrics.report()
+        self.assertEqual(report["stages"]["stage"]["calls"], 8)
+        self.assertGreaterEqual(report["stages"]["stage"]["seconds"], report["stages"]["stage"]["max_seconds"])
+        self.assertEqual(report["counters"], {"rows": 80})
+        run_metrics.reset()
+        self.assertEqual(run_metrics.report()["counters"], dict())
+
+    def test_timer_on_error(self):
+        run_metrics = Metrics()
+        with self.assertRaises(ValueError):
+            with run_metrics.timer("stage"):
+                raise ValueError
+        self.assertEqual(run_metrics.report()["stages"]["stage"]["calls"], 1)
+
+    def test_write_report_and_profile(self):
+        run_metrics = Metrics()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_path = os.path.join(tmp_dir, "run.prof")
+            with profiled(profile_path):
+                run_metrics.increment("http_calls.github")
+            self.assertTrue(os.path.exists(profile_path))
+            report_path = os.path.join(tmp_dir, "reports", "report.json")
+            run_metrics.write_report(report_path)
+            with open(report_path, "r", encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["counters"], {"http_calls.github": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
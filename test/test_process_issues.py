@@ -15,7 +15,17 @@
 # SOFTWARE.
 
 
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from process_issues import *
+from threading import Thread
+from unittest.mock import MagicMock, patch
+import gzip
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 
 
@@ -51,6 +61,40 @@ VALID_BODY = """
 """
 
 
+def raise_http_error(status_code:int) -> None:
+    raise requests.HTTPError(f"{status_code} Client Error", response=MagicMock(status_code=status_code))
+
+
+class ZenodoStandIn(BaseHTTPRequestHandler):
+    files = dict()
+    puts = 0
+
+    def __send_json(self, status:int, data:dict) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.__send_json(201, {"id": 1, "links": {"bucket": f"http://localhost:{self.server.server_port}/files/bucket"}})
+
+    def do_GET(self):
+        self.__send_json(200, {"contents": [{"key": key, "checksum": f"md5:{hashlib.md5(data).hexdigest()}"} for key, data in self.files.items()]})
+
+    def do_PUT(self):
+        ZenodoStandIn.puts += 1
+        data = self.rfile.read(int(self.headers["Content-Length"]))
+        key = self.path.split("?")[0].split("/")[-1]
+        self.files[key] = data
+        self.__send_json(201, {"key": key, "checksum": f"md5:{hashlib.md5(data).hexdigest()}"})
+
+    def log_message(self, format, *args):
+        pass
+
+
 class Test_process_issues(unittest.TestCase):
     def test_valid_title_and_body(self):
         issue_title = "deposit localhost:330 doi:10.1007/s42835-022-01029-y"
@@ -80,6 +124,13 @@ class Test_process_issues(unittest.TestCase):
         expected_message = "The identifier with literal value 10.1007/s42835-022-01029-y. specified in the issue title is not a valid DOI"
         self.assertEqual((is_valid, message), (False, expected_message))
     
+    def test_title_unsupported_schema(self):
+        issue_title = "deposit x url:https://example.org"
+        issue_body = VALID_BODY
+        is_valid, message = validate(issue_title, issue_body)
+        expected_message = "The identifier with literal value https://example.org specified in the issue title is not a valid URL, as URL identifiers are not supported yet"
+        self.assertEqual((is_valid, message), (False, expected_message))
+
     def test_body_no_sep(self):
         issue_title = "deposit localhost:330 doi:10.1007/s42835-022-01029-y"
         issue_body = VALID_BODY.replace("===###===@@@===", "")
@@ -91,7 +142,7 @@ class Test_process_issues(unittest.TestCase):
         issue_title = "deposit localhost:330 doi:10.1007/s42835-022-01029-y"
         issue_body = VALID_BODY + ",,,,,"
         is_valid, message = validate(issue_title, issue_body)
-        expected_message = 'The data you provided could not be processed as a CSV. Please, check that the metadata CSV and the citation CSV are valid CSVs'
+        expected_message = 'The data you provided could not be processed as a CSV. Please, check that the metadata CSV and the citation CSV are valid CSVs. line 30: expected 4 fields, found 6'
         self.assertEqual((is_valid, message), (False, expected_message))
     
     def test_get_data_to_store(self):
@@ -121,6 +172,240 @@ class Test_process_issues(unittest.TestCase):
         output = is_in_whitelist(3869248)
         self.assertEqual(output, False)
 
+    @patch("process_issues.answer")
+    @patch("process_issues.validate", return_value=(True, ""))
+    @patch("process_issues.is_in_whitelist", side_effect=lambda user_id: user_id != 2)
+    @patch("process_issues.get_user_id", side_effect=lambda username, node_id=None: time.sleep(0.05 * (4 - int(username))) or int(username))
+    def test_process_issues(self, mock_get_user_id, mock_is_in_whitelist, mock_validate, mock_answer):
+        issues = [
+            {"number": number, "author": {"login": str(number)}, "title": "deposit localhost:330 doi:10.1007/s42835-022-01029-y", "body": VALID_BODY, "createdAt": "2022-09-16T22:34:30Z", "url": f"https://github.com/arcangelo7/issues/issues/{number}"}
+            for number in range(4)]
+        output = process_issues(issues, max_workers=4)
+        self.assertEqual([data["provenance"]["wasAttributedTo"] for data in output], [0, 1, 3])
+        self.assertEqual(output[2]["provenance"]["hadPrimarySource"], "https://github.com/arcangelo7/issues/issues/3")
+        self.assertEqual(mock_answer.call_count, 4)
+        mock_answer.assert_any_call(False, "To make a deposit, please contact OpenCitations at <contact@opencitations.net> to register as a trusted user", "2")
+
+    def test_cache_ttl(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache", "user_ids.json")
+            save_cache({"fresh": {"id": 1, "timestamp": time.time()}, "stale": {"id": 2, "timestamp": time.time() - 100}}, path)
+            self.assertEqual(list(load_cache(path, 50).keys()), ["fresh"])
+            self.assertEqual(load_cache(os.path.join(tmp_dir, "missing.json"), 50), dict())
+
+    @patch.dict(os.environ, {"GH_TOKEN": "token"})
+    @patch("process_issues.requests.get")
+    @patch("process_issues.requests.post")
+    def test_batch_get_user_ids(self, mock_post, mock_get):
+        user_ids.clear()
+        authors = [{"id": "MDQ6VXNlcjM4NjkyNDc=", "login": "essepuntato"}, {"id": "MDQ6VXNlcjQyMDA4NjA0", "login": "arcangelo7"}]
+        mock_post.return_value = MagicMock(status_code=200, json=lambda: {"data": {"nodes": [{"id": "MDQ6VXNlcjM4NjkyNDc=", "databaseId": 3869247}, {"id": "MDQ6VXNlcjQyMDA4NjA0", "databaseId": 42008604}]}})
+        output = get_user_ids(authors + authors[:1])
+        self.assertEqual(output, {"essepuntato": 3869247, "arcangelo7": 42008604})
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(mock_post.call_args.kwargs["json"]["variables"], {"ids": ["MDQ6VXNlcjM4NjkyNDc=", "MDQ6VXNlcjQyMDA4NjA0"]})
+        get_user_ids(authors[1:])
+        self.assertEqual(get_author_id(authors[0]), 3869247)
+        self.assertEqual(mock_post.call_count, 1)
+        mock_get.assert_not_called()
+        self.assertEqual(set(user_ids), {"MDQ6VXNlcjM4NjkyNDc=", "MDQ6VXNlcjQyMDA4NjA0"})
+        user_ids.clear()
+
+    @patch("process_issues.requests.get")
+    def test_renamed_login_user_id(self, mock_get):
+        user_ids.clear()
+        mock_get.return_value = MagicMock(status_code=200, text=json.dumps({"id": 1, "node_id": "MDQ6VXNlcjE="}))
+        self.assertIsNone(get_user_id("arcangelo7", "MDQ6VXNlcjQyMDA4NjA0"))
+        self.assertEqual(user_ids, dict())
+        self.assertEqual(get_user_id("arcangelo7", "MDQ6VXNlcjE="), 1)
+        self.assertEqual(list(user_ids), ["MDQ6VXNlcjE="])
+        user_ids.clear()
+
+    def test_get_id_manager(self):
+        self.assertIs(get_id_manager("issn"), get_id_manager("ISSN"))
+
+    @patch("process_issues.requests.get")
+    def test_validate_title_ids(self, mock_get):
+        validated_ids.clear()
+        mock_get.side_effect = lambda url, timeout: MagicMock(status_code=404 if url.endswith(".") else 200, json=lambda: {"responseCode": 1})
+        validate_title_ids([
+            "deposit localhost:330 doi:10.1007/s42835-022-01029-y",
+            "deposit localhost:331 doi:10.1007/s42835-022-01029-y",
+            "deposit localhost:330 doi:10.1007/s42835-022-01029-y.",
+            "deposits localhost:330 doi:10.1007/s42835-022-01029-y"])
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(validate("deposit localhost:330 doi:10.1007/s42835-022-01029-y", VALID_BODY)[0], True)
+        self.assertEqual(validate("deposit localhost:330 doi:10.1007/s42835-022-01029-y.", VALID_BODY)[0], False)
+        self.assertEqual(mock_get.call_count, 2)
+        validated_ids.clear()
+
+    @patch("process_issues.time.sleep")
+    @patch("process_issues.requests.get", side_effect=requests.ConnectionError)
+    def test_validate_unreachable_api(self, mock_get, mock_sleep):
+        validated_ids.clear()
+        is_valid, message = validate("deposit localhost:330 doi:10.1007/s42835-022-01029-y", VALID_BODY)
+        self.assertEqual((is_valid, message), (None, "The identifier with literal value 10.1007/s42835-022-01029-y specified in the issue title could not be checked because the DOI service did not answer"))
+        self.assertEqual(validated_ids, dict())
+        self.assertEqual(mock_get.call_count, 3)
+        mock_get.side_effect = None
+        mock_get.return_value = MagicMock(status_code=200, json=lambda: {"responseCode": 1})
+        self.assertEqual(validate("deposit localhost:330 doi:10.1007/s42835-022-01029-y", VALID_BODY)[0], True)
+        validated_ids.clear()
+
+    @patch("process_issues.requests.get")
+    def test_is_valid_pmid(self, mock_get):
+        validated_ids.clear()
+        mock_get.side_effect = lambda url, timeout: MagicMock(status_code=200, text='<meta name="uid" content="2942070">' if "/2942070/" in url else "<html>Search results</html>")
+        self.assertEqual(is_valid_id("pmid", "2942070"), True)
+        self.assertEqual(is_valid_id("pmid", "99999999"), False)
+        mock_get.assert_any_call("https://pubmed.ncbi.nlm.nih.gov/2942070/?format=pmid", timeout=30)
+        validated_ids.clear()
+
+    @patch("process_issues.answer")
+    @patch("process_issues.validate", return_value=(None, "Unchecked"))
+    @patch("process_issues.is_in_whitelist", return_value=True)
+    @patch("process_issues.get_user_id", return_value=42008604)
+    def test_process_issues_postponed(self, mock_get_user_id, mock_is_in_whitelist, mock_validate, mock_answer):
+        issue = {"number": 1, "author": {"login": "arcangelo7"}, "title": "deposit localhost:330 doi:10.1007/s42835-022-01029-y", "body": VALID_BODY, "createdAt": "2022-09-16T22:34:30Z", "url": "https://github.com/arcangelo7/issues/issues/1"}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state = StateStore(os.path.join(tmp_dir, "issues_state.sqlite"))
+            self.assertEqual(process_issues([issue], state=state), [])
+            mock_answer.assert_not_called()
+            self.assertIsNone(state.get(issue))
+
+    def test_validate_title_ids_lazy_import(self):
+        code = "import sys, process_issues; process_issues.validate_title_ids([]); process_issues.validate_title_ids(['deposits localhost:330 doi:10.1007/s42835-022-01029-y']); print('oc_idmanager' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True)
+        self.assertEqual(output.stdout.strip(), "False")
+
+    def test_load_whitelist_reload(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "whitelist.txt")
+            with open(path, "w") as f:
+                f.write("3869247\n42008604\n")
+            self.assertEqual(load_whitelist(path), {"3869247", "42008604"})
+            with patch("builtins.open") as mock_open:
+                load_whitelist(path)
+                mock_open.assert_not_called()
+            with open(path, "a") as f:
+                f.write("1\n")
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+            self.assertEqual(load_whitelist(path), {"3869247", "42008604", "1"})
+        load_whitelist()
+
+    def test_store_deposits(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, ".cache", "data_to_store.jsonl.gz")
+            self.assertEqual(store_deposits(iter([]), path), 0)
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(store_deposits(iter([{"n": 1}, {"n": 2}]), path), 2)
+            self.assertEqual(store_deposits(iter([{"n": 3}]), path), 1)
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                self.assertEqual([json.loads(line) for line in f], [{"n": 1}, {"n": 2}, {"n": 3}])
+
+    @patch("process_issues.answer")
+    @patch("process_issues.validate", return_value=(True, "Thanks"))
+    @patch("process_issues.is_in_whitelist", return_value=True)
+    def test_store_processed_issues(self, mock_is_in_whitelist, mock_validate, mock_answer):
+        issues = [
+            {"number": number, "author": {"login": str(number)}, "title": "deposit localhost:330 doi:10.1007/s42835-022-01029-y", "body": VALID_BODY, "createdAt": "2022-09-16T22:34:30Z", "url": f"https://github.com/arcangelo7/issues/issues/{number}"}
+            for number in range(3)]
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch("process_issues.get_user_id", side_effect=[0, 1, RuntimeError]):
+            path = os.path.join(tmp_dir, "data_to_store.jsonl.gz")
+            state = StateStore(os.path.join(tmp_dir, "issues_state.sqlite"))
+            with self.assertRaises(RuntimeError):
+                store_processed_issues(issues, max_workers=1, state=state, path=path, batch_size=2)
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                self.assertEqual([json.loads(line)["provenance"]["wasAttributedTo"] for line in f], [0, 1])
+            self.assertEqual([state.has(issue, STORED) for issue in issues], [True, True, False])
+            state.close()
+
+    @patch.dict(os.environ, {"ZENODO": "token"})
+    def test_deposit_on_zenodo(self):
+        server = ThreadingHTTPServer(("localhost", 0), ZenodoStandIn)
+        Thread(target=server.serve_forever, daemon=True).start()
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch("process_issues.ZENODO_API", f"http://localhost:{server.server_port}/api"), \
+                patch("process_issues.ZENODO_STATE_PATH", os.path.join(tmp_dir, "zenodo_deposition.json")), \
+                patch("process_issues.UPLOAD_CHUNK_SIZE", 16):
+            path = os.path.join(tmp_dir, "data_to_store.jsonl.gz")
+            store_deposits(iter([{"n": n} for n in range(100)]), path)
+            with open(path, "rb") as f:
+                data = f.read()
+            deposit_on_zenodo(path)
+            self.assertEqual(list(ZenodoStandIn.files.values()), [data])
+            self.assertFalse(os.path.exists(path))
+            with open(path, "wb") as f:
+                f.write(data)
+            deposit_on_zenodo(path)
+            self.assertEqual(ZenodoStandIn.puts, 1)
+        server.shutdown()
+
+    @patch("process_issues.answer")
+    @patch("process_issues.validate", return_value=(True, "Thanks"))
+    @patch("process_issues.is_in_whitelist", return_value=True)
+    @patch("process_issues.get_user_id", return_value=42008604)
+    def test_process_issues_resume(self, mock_get_user_id, mock_is_in_whitelist, mock_validate, mock_answer):
+        issues = [
+            {"number": number, "author": {"login": "arcangelo7"}, "title": "deposit localhost:330 doi:10.1007/s42835-022-01029-y", "body": VALID_BODY, "createdAt": "2022-09-16T22:34:30Z", "url": f"https://github.com/arcangelo7/issues/issues/{number}"}
+            for number in range(3)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state = StateStore(os.path.join(tmp_dir, "issues_state.sqlite"))
+            state.mark(issues[0], VALIDATED, valid=True, message="Thanks")
+            state.mark(issues[0], ANSWERED)
+            state.mark(issues[0], STORED)
+            state.mark(issues[1], VALIDATED, valid=True, message="Thanks")
+            state.mark(issues[1], ANSWERED)
+            output = process_issues(issues, max_workers=2, state=state)
+            self.assertEqual([data["provenance"]["hadPrimarySource"] for data in output], [issues[1]["url"], issues[2]["url"]])
+            self.assertEqual(mock_validate.call_count, 1)
+            mock_answer.assert_called_once_with(True, "Thanks", "2")
+            self.assertTrue(all(state.has(issue, STORED) for issue in issues))
+
+    def test_get_data_to_store_deduplicated(self):
+        issue_title = "deposit localhost:330 doi:10.1007/s42835-022-01029-y"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = DepositIndex(os.path.join(tmp_dir, "deposit_index.sqlite"))
+            output = get_data_to_store(issue_title, VALID_BODY, "2022-09-16T22:34:30Z", "https://github.com/arcangelo7/issues/issues/1", 42008604, index=index)
+            self.assertEqual((len(output["data"]["metadata"]), len(output["data"]["citations"])), (13, 12))
+            index.commit()
+            resubmitted_body = VALID_BODY.replace('"doi:10.1007/s42835-022-01029-y","2022-02-28","doi:10.1109/20.877674"', '"DOI:10.1007/S42835-022-01029-Y","2022-02-28","doi:10.1109/20.877675"')
+            output = get_data_to_store(issue_title, resubmitted_body, "2022-09-17T22:34:30Z", "https://github.com/arcangelo7/issues/issues/2", 42008604, index=index)
+            self.assertEqual([row["id"] for row in output["data"]["metadata"]], ["", ""])
+            self.assertEqual([row["cited_id"] for row in output["data"]["citations"]], ["doi:10.1109/20.877675"])
+            index.close()
+
+    @patch("process_issues.answer")
+    @patch("process_issues.validate", return_value=(True, "Thanks"))
+    @patch("process_issues.is_in_whitelist", return_value=True)
+    @patch("process_issues.get_user_id", side_effect=lambda username, node_id=None: time.sleep(0.1 * (username == "0")) or int(username))
+    def test_process_issues_deduplicated_in_order(self, mock_get_user_id, mock_is_in_whitelist, mock_validate, mock_answer):
+        issues = [
+            {"number": number, "author": {"login": str(number)}, "title": "deposit localhost:330 doi:10.1007/s42835-022-01029-y", "body": VALID_BODY, "createdAt": "2022-09-16T22:34:30Z", "url": f"https://github.com/arcangelo7/issues/issues/{number}"}
+            for number in range(2)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = DepositIndex(os.path.join(tmp_dir, "deposit_index.sqlite"))
+            output = process_issues(issues, max_workers=2, index=index)
+            self.assertEqual([len(data["data"]["citations"]) for data in output], [12, 0])
+            index.close()
+
+    @patch("process_issues.answer", side_effect=lambda is_valid, message, issue_number: issue_number == "1" and raise_http_error(410))
+    @patch("process_issues.validate", return_value=(True, "Thanks"))
+    @patch("process_issues.is_in_whitelist", return_value=True)
+    @patch("process_issues.get_user_id", return_value=42008604)
+    def test_process_issues_github_error(self, mock_get_user_id, mock_is_in_whitelist, mock_validate, mock_answer):
+        issues = [
+            {"number": number, "author": {"login": "arcangelo7"}, "title": "deposit localhost:330 doi:10.1007/s42835-022-01029-y", "body": VALID_BODY, "createdAt": "2022-09-16T22:34:30Z", "url": f"https://github.com/arcangelo7/issues/issues/{number}"}
+            for number in range(3)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state = StateStore(os.path.join(tmp_dir, "issues_state.sqlite"))
+            output = process_issues(issues, max_workers=3, state=state)
+            self.assertEqual([data["provenance"]["hadPrimarySource"] for data in output], [issues[0]["url"], issues[2]["url"]])
+            self.assertFalse(state.has(issues[1], ANSWERED))
+            self.assertTrue(state.has(issues[2], STORED))
+            state.close()
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, Arcangelo Massari <arcangelo.massari@unibo.it>
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+
+from state_store import *
+import tempfile
+import unittest
+
+
+ISSUE = {"number": 1, "title": "deposit localhost:330 doi:10.1007/s42835-022-01029-y", "body": "body"}
+
+
+class Test_state_store(unittest.TestCase):
+    def test_mark_and_reload(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "state", "issues_state.sqlite")
+            state = StateStore(path)
+            state.mark(ISSUE, VALIDATED, valid=True, message="Thanks")
+            state.mark(ISSUE, ANSWERED)
+            state = StateStore(path)
+            self.assertTrue(state.has(ISSUE, ANSWERED))
+            self.assertFalse(state.has(ISSUE, STORED))
+            self.assertEqual(state.get(ISSUE)["message"], "Thanks")
+            self.assertEqual(state.pending(ANSWERED, STORED, valid=True), [1])
+            self.assertEqual(state.pending(ANSWERED, STORED, valid=False), [])
+            state.close()
+
+    def test_changed_content(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state = StateStore(os.path.join(tmp_dir, "issues_state.sqlite"))
+            state.mark(ISSUE, VALIDATED, valid=False, message="Invalid")
+            edited_issue = dict(ISSUE, body="edited body")
+            self.assertIsNone(state.get(edited_issue))
+            state.mark(edited_issue, VALIDATED, valid=True, message="Thanks")
+            self.assertFalse(state.has(ISSUE, VALIDATED))
+            self.assertEqual(state.get(edited_issue)["valid"], True)
+            state.close()
+
+    def test_record_without_body_and_remove(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "issues_state.sqlite")
+            state = StateStore(path)
+            state.mark(dict(ISSUE, body="x" * 100000), INGESTED)
+            self.assertNotIn("x" * 100, json.dumps(state.records))
+            self.assertLess(os.path.getsize(path) + os.path.getsize(f"{path}-wal"), 100000)
+            state.remove(ISSUE)
+            state.close()
+            state = StateStore(path)
+            self.assertEqual(state.records, dict())
+            state.close()
+
+
+if __name__ == '__main__':
+    unittest.main()